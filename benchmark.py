@@ -0,0 +1,325 @@
+"""
+
+This file times the hot paths of the simulation on the shipped maps and on generated large maps:
+
+- load: Environment.load_from_file
+- vision: utils.initialize_vision_ranges (without the vision cache, and skipped when VISION_LAZY is True)
+- visibility: utils.is_pos_visible_from_pos between random positions
+- appearance: utils.get_object_appearance of objects within the vision range of each camera
+- match: utils.get_best_object_match of handshakes between cameras
+- frame: one headless frame of the tracking algorithm in main.py (see simulator.py)
+
+Each benchmark reports its best and mean time over several repetitions, its throughput (operations per
+second of the best repetition) and the peak memory allocated by one extra repetition, measured with
+tracemalloc. The results are written to a JSON file, and passing an older JSON file with --compare prints
+how much each benchmark sped up or slowed down since then.
+
+Example:
+
+    python benchmark.py --generate 1k --output after.json --compare before.json
+
+"""
+
+import argparse
+import constants
+import generate_map
+import glob
+import json
+import map_format
+import numpy as np
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import utils
+from environment import Environment
+from simulator import Simulator
+
+BENCHMARKS = ("load", "vision", "visibility", "appearance", "match", "frame")
+
+# Presets of generate_map.py whose vision ranges do not fit in memory at once (10000 cameras over a 1000x1000 map
+# need about 10 GB), so they are always benchmarked with VISION_LAZY.
+LAZY_PRESETS = ("10k",)
+
+"""
+
+Inputs:
+- function -> a function that runs the benchmark once and returns the number of operations it performed
+- repeat -> the number of timed repetitions
+- setup -> if not None, a function called before every repetition, which is not timed
+
+Output:
+- A dictionary of the number of operations per repetition, the best and mean time of a repetition in seconds,
+the throughput in operations per second, and the peak memory of a repetition in bytes
+
+"""
+def measure(function, repeat, setup = None):
+    times = list()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        operations = function()
+        times.append(time.perf_counter() - start)
+
+    # Memory is measured separately since tracemalloc slows down every allocation
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "operations": operations,
+        "best_seconds": best,
+        "mean_seconds": sum(times) / len(times),
+        "operations_per_second": operations / max(best, 1e-12),
+        "peak_memory_bytes": peak_memory,
+    }
+
+"""
+
+Inputs:
+- preset -> the name of a preset of generate_map.py
+
+Output:
+- The name of a binary map generated from the preset, which is only generated the first time it is needed
+
+"""
+def get_generated_map(preset):
+    map_name = "benchmark_" + preset + map_format.BINARY_MAP_EXTENSION
+    if not os.path.exists("maps/" + map_name):
+        walls, objects, cameras = generate_map.generate_map(**generate_map.PRESETS[preset])
+        map_format.write_binary_map("maps/" + map_name, walls, objects, cameras)
+    return map_name
+
+"""
+
+Inputs:
+- environment -> an environment whose vision ranges have been initialized
+- limit -> the largest number of pairs to return
+
+Output:
+- A list of (camera, object) pairs where the object is within the camera's vision range and the camera can see it
+
+"""
+def get_visible_pairs(environment, limit):
+    pairs = list()
+    for object in environment.objects:
+        for camera in utils.get_cameras_seeing_object(object, environment):
+            if utils.can_camera_see_object(camera, object, environment):
+                pairs.append((camera, object))
+                if len(pairs) == limit:
+                    return pairs
+    return pairs
+
+"""
+
+Inputs:
+- map_name -> the name of a map
+- benchmarks -> the names of the benchmarks to run
+- repeat -> the number of timed repetitions of every benchmark except vision
+- vision_repeat -> the number of timed repetitions of the vision benchmark
+- frames -> the number of frames simulated by the frame benchmark
+- samples -> the largest number of positions, appearances, or matches timed by one repetition
+
+Output:
+- A list of result dictionaries, one for each benchmark that could be run on the map
+
+"""
+def run_benchmarks(map_name, benchmarks, repeat, vision_repeat, frames, samples):
+    results = list()
+    def record(benchmark, result):
+        result = dict(map = map_name, benchmark = benchmark, vision_lazy = constants.VISION_LAZY, handoff_graph = constants.HANDOFF_GRAPH, **result)
+        results.append(result)
+        print_result(result)
+
+    if "load" in benchmarks:
+        def load():
+            Environment(map_name)
+            return 1
+        record("load", measure(load, repeat))
+
+    # Lazy vision stores build vision ranges as they are used, so there is nothing to time up front
+    if "vision" in benchmarks and not constants.VISION_LAZY:
+        vision_cache_enabled = constants.VISION_CACHE
+        constants.VISION_CACHE = False
+        fresh = dict()
+        def setup():
+            fresh["environment"] = Environment(map_name)
+        def build():
+            utils.initialize_vision_ranges(fresh["environment"])
+            return len(fresh["environment"].cameras)
+        try:
+            record("vision", measure(build, vision_repeat, setup))
+        finally:
+            constants.VISION_CACHE = vision_cache_enabled
+
+    environment = Environment(map_name)
+    utils.initialize_vision_ranges(environment)
+    rng = np.random.default_rng(0)
+    height, width = environment.map.shape
+
+    if "visibility" in benchmarks:
+        starts = list(zip(rng.integers(0, width, samples).tolist(), rng.integers(0, height, samples).tolist()))
+        ends = list(zip(rng.integers(0, width, samples).tolist(), rng.integers(0, height, samples).tolist()))
+        def check_visibility():
+            for start, end in zip(starts, ends):
+                utils.is_pos_visible_from_pos(start, end, environment)
+            return samples
+        record("visibility", measure(check_visibility, repeat))
+
+    pairs = get_visible_pairs(environment, samples)
+    clear_cache = environment.appearance_cache.clear
+    if "appearance" in benchmarks and len(pairs) > 0:
+        def get_appearances():
+            for camera, object in pairs:
+                utils.get_object_appearance(camera, object, environment)
+            return len(pairs)
+        record("appearance", measure(get_appearances, repeat, clear_cache))
+
+    if "match" in benchmarks and len(pairs) > 0:
+        # Every visible object is matched by every camera that can see it, as if a handshake had just been received
+        handshakes = [(camera, object.pos, np.array(utils.get_object_appearance(camera, object, environment))) for camera, object in pairs]
+        def match_handshakes():
+            for camera, target_pos, target_appearance in handshakes:
+                candidates = utils.get_candidate_objects(camera, target_pos, environment)
+                utils.get_best_object_match(camera, candidates, target_pos, target_appearance, environment, verbose = False)
+            return len(handshakes)
+        record("match", measure(match_handshakes, repeat, clear_cache))
+
+    if "frame" in benchmarks and len(pairs) > 0:
+        tracked_object_id = pairs[0][1].id
+        simulation = dict()
+        def close():
+            # The vision store of the previous repetition's environment holds a prefetch thread until it is closed
+            if "simulator" in simulation and simulation["simulator"].environment.vision_store is not None:
+                simulation["simulator"].environment.vision_store.close()
+        def setup():
+            # Each repetition simulates the same frames of a freshly loaded map
+            close()
+            fresh = Environment(map_name)
+            if environment.vision_store is None:
+                fresh.set_vision_ranges(environment.vision_ranges)
+            else:
+                utils.initialize_vision_ranges(fresh)
+            if constants.HANDOFF_GRAPH:
+                fresh.get_camera_graph()
+            simulation["simulator"] = Simulator(fresh, tracked_object_id)
+        def simulate():
+            return len(simulation["simulator"].run(frames))
+        try:
+            record("frame", measure(simulate, repeat, setup))
+        finally:
+            close()
+    if environment.vision_store is not None:
+        environment.vision_store.close()
+    return results
+
+"""
+
+Inputs:
+- result -> a result dictionary of run_benchmarks()
+
+Output:
+- N/A
+
+"""
+def print_result(result):
+    print(
+        "{:<28} {:<10} {:>12.6f} s {:>14.1f} ops/s {:>10.2f} MB".format(
+            result["map"],
+            result["benchmark"],
+            result["best_seconds"],
+            result["operations_per_second"],
+            result["peak_memory_bytes"] / 1e6,
+        )
+    )
+
+"""
+
+Inputs:
+- results -> a list of result dictionaries of run_benchmarks()
+- previous_file_path -> path of a JSON file written by an earlier run of this benchmark
+
+Output:
+- N/A
+
+Description:
+This function prints the speedup (previous best time divided by current best time) and the change in peak memory
+of every benchmark that was run both times.
+
+"""
+def print_comparison(results, previous_file_path):
+    with open(previous_file_path) as f:
+        previous = json.load(f)
+    previous_results = {(result["map"], result["benchmark"]): result for result in previous["results"]}
+    print("Compared to", previous_file_path, "(revision " + str(previous.get("revision")) + ")")
+    for result in results:
+        old = previous_results.get((result["map"], result["benchmark"]))
+        if old is None:
+            continue
+        speedup = old["best_seconds"] / max(result["best_seconds"], 1e-12)
+        memory = (result["peak_memory_bytes"] - old["peak_memory_bytes"]) / 1e6
+        print("{:<28} {:<10} {:>8.2f}x speed {:>+10.2f} MB".format(result["map"], result["benchmark"], speedup, memory))
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- The current git commit hash, or None if it cannot be determined
+
+"""
+def get_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr = subprocess.DEVNULL, text = True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    shipped_maps = sorted(os.path.basename(path) for path in glob.glob("maps/*.txt"))
+    parser = argparse.ArgumentParser(description="Time the hot paths of the simulation.")
+    parser.add_argument("--maps", nargs="*", default=shipped_maps, help="names of maps within the maps folder")
+    parser.add_argument("--generate", nargs="*", default=[], choices=sorted(generate_map.PRESETS), help="presets of generate_map.py to also benchmark")
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed repetitions of each benchmark")
+    parser.add_argument("--vision-repeat", type=int, default=1, help="number of timed repetitions of the vision benchmark")
+    parser.add_argument("--frames", type=int, default=100, help="number of frames simulated by the frame benchmark")
+    parser.add_argument("--samples", type=int, default=1000, help="number of positions, appearances and matches timed by each repetition")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare the results with")
+    args = parser.parse_args()
+
+    maps = [(map_name, False) for map_name in args.maps] + [(get_generated_map(preset), preset in LAZY_PRESETS) for preset in args.generate]
+    results = list()
+    vision_lazy = constants.VISION_LAZY
+    for map_name, lazy in maps:
+        constants.VISION_LAZY = vision_lazy or lazy
+        try:
+            results.extend(run_benchmarks(map_name, args.benchmarks, args.repeat, args.vision_repeat, args.frames, args.samples))
+        finally:
+            constants.VISION_LAZY = vision_lazy
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "revision": get_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "vision_algorithm": constants.VISION_ALGORITHM,
+            "vision_workers": constants.VISION_WORKERS,
+            "results": results,
+        }, f, indent = 2)
+    print("Results written to", args.output)
+    if args.compare is not None:
+        print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,13 @@
 A camera is defined by a point within an environment that can used to detect objects
 within a defined vision range. Depending on the situation, a camera may either have an
 empty handshake (None) or a non-empty handshake (tuple of x,y position and object appearance).
+When many objects are tracked at once (see multi_tracker.py), a camera's handshakes are kept in
+handshakes instead, keyed by the id of the tracked target they belong to.
 
 Cameras are initialized with load_from_file() in environment.py and initialize_vision_ranges()
-in utils.py.
+in utils.py. A camera does not hold its vision range. It is read from the packed vision ranges owned by
+its environment (see packed_vision.py), or from the environment's vision store when vision ranges are
+built lazily (see vision_store.py).
 
 """
 
@@ -14,9 +18,27 @@ class Camera:
     def __init__(self, id, x, y):
         self.id = id
         self.pos = self.x, self.y = x, y
-        self.vision_range = None
-        self.handshake = None 
-        
-        
+        # The PackedVisionRanges or VisionStore the camera's vision range is read from
+        self.vision_source = None
+        self.handshake = None
+        self.handshakes = dict()
 
-    
\ No newline at end of file
+    @property
+    def vision_range(self):
+        return self.vision_source.get(self.id)
+
+    """
+
+    Inputs:
+    - x0, y0 -> the top left corner of a rectangle of tiles (inclusive)
+    - x1, y1 -> the bottom right corner of the rectangle (exclusive)
+
+    Output:
+    - Boolean array of the tiles of the rectangle, clipped to the map, that the camera can see
+
+    Description:
+    This function is cheaper than slicing vision_range, which unpacks the camera's whole vision range.
+
+    """
+    def get_visible_region(self, x0, y0, x1, y1):
+        return self.vision_source.get_visible(self.id, x0, y0, x1, y1)
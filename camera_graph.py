@@ -0,0 +1,322 @@
+"""
+
+A camera graph connects every pair of cameras whose vision ranges overlap. Each edge is weighted by
+the number of tiles both cameras can see, and each direction of an edge holds the boundary tiles
+where coverage passes from one camera to the other: the tiles both cameras can see that lie on the
+edge of the first camera's vision range (next to a tile it cannot see). An object leaving the first
+camera's vision range through one of these tiles is still seen by the second camera.
+
+The graph is used to decide which cameras to try first when the tracking camera loses the tracked
+object (step 3a of the algorithm in main.py, see HANDOFF_GRAPH in constants.py). Cameras connected
+to the tracking camera whose boundary tiles lie ahead of the object's motion are tried before any
+other camera that received a handshake.
+
+Building the graph reads every camera's vision range once and keeps a bit-packed copy of the part of
+it within the bounding box of the tiles the camera can see. Only pairs of cameras whose bounding boxes
+overlap are compared, so the cost depends on how densely cameras overlap and not on the square of the
+number of cameras.
+
+When vision ranges are built lazily (see vision_store.py), reading every vision range would build all of
+them, so the graph is built on demand instead: an edge is only computed the first time a hand-off asks
+for it, and only the vision ranges of the tracking cameras and the cameras that received their handshakes
+are read. In that case get_neighbors() only knows the edges computed so far.
+
+"""
+
+import numpy as np
+
+class CameraGraph:
+
+    """
+
+    Inputs:
+    - environment -> an environment whose vision ranges have been initialized
+    - lazy -> if True, edges are only computed when they are first needed (see get_boundary())
+
+    """
+    def __init__(self, environment, lazy = False):
+        self.environment = environment
+        self.lazy = lazy
+        num_cameras = len(environment.cameras)
+        # Bounding box (x0, y0, x1, y1) of the tiles each camera can see, with exclusive ends
+        self.boxes = np.zeros((num_cameras, 4), dtype=np.int64)
+        # Bit-packed masks of the tiles within each camera's bounding box that the camera can see, and that lie on
+        # the edge of its vision range (see get_coverage_edge())
+        self.visible_masks = [None] * num_cameras
+        self.edge_masks = [None] * num_cameras
+        # Maps each camera id to a dictionary mapping its neighbors' ids to the number of tiles both can see
+        self.shared_areas = [dict() for _ in range(num_cameras)]
+        # Maps (camera id, neighbor id) to an (n,2) array of the (x,y) boundary tiles from the camera to the neighbor
+        self.boundaries = dict()
+        # Whether the masks of each camera have been read (see read_camera())
+        self.is_read = np.zeros(num_cameras, dtype=bool)
+        # The pairs (camera id, neighbor id), with camera id < neighbor id, whose edge has been computed when lazy
+        self.connected_pairs = set()
+        if lazy:
+            return
+        for camera_id in range(num_cameras):
+            self.read_camera(camera_id)
+        for camera_id in range(num_cameras):
+            for neighbor_id in self.get_overlapping_boxes(camera_id).tolist():
+                if neighbor_id > camera_id:
+                    self.connect(camera_id, neighbor_id)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - N/A
+
+    Description:
+    This function reads the camera's vision range and keeps the parts of it that edges are computed from. Every
+    vision range is read only once, so building the graph does not keep rebuilding the vision ranges that a vision
+    store (see vision_store.py) evicts.
+
+    """
+    def read_camera(self, camera_id):
+        vision_range = self.environment.cameras[camera_id].vision_range
+        box = get_visible_box(vision_range)
+        x0, y0, x1, y1 = box
+        self.boxes[camera_id] = box
+        self.visible_masks[camera_id] = np.packbits(vision_range[y0:y1, x0:x1] == 1, axis=1)
+        self.edge_masks[camera_id] = np.packbits(get_coverage_edge(vision_range, box), axis=1)
+        self.is_read[camera_id] = True
+
+    """
+
+    Inputs:
+    - masks -> visible_masks or edge_masks
+    - camera_id -> the id of a camera
+    - box -> a rectangle (x0, y0, x1, y1) of tiles within the camera's bounding box, with exclusive ends
+
+    Output:
+    - Boolean array of the camera's mask over the rectangle
+
+    """
+    def get_mask(self, masks, camera_id, box):
+        x0, y0, x1, y1 = box
+        box_x0, box_y0, box_x1, _ = self.boxes[camera_id]
+        rows = np.unpackbits(masks[camera_id][y0 - box_y0:y1 - box_y0], axis=1, count=int(box_x1 - box_x0))
+        return rows[:, x0 - box_x0:x1 - box_x0].astype(bool)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - Array of the ids of every other camera whose bounding box overlaps the camera's bounding box, in increasing order
+
+    """
+    def get_overlapping_boxes(self, camera_id):
+        x0, y0, x1, y1 = self.boxes[camera_id]
+        boxes = self.boxes
+        overlapping = (boxes[:, 0] < x1) & (boxes[:, 2] > x0) & (boxes[:, 1] < y1) & (boxes[:, 3] > y0)
+        overlapping[camera_id] = False
+        return np.flatnonzero(overlapping)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - neighbor_id -> the id of another camera
+
+    Output:
+    - N/A
+
+    Description:
+    This function computes the edge between two cameras from their masks, replacing any previous edge. No edge is
+    kept if the cameras cannot see any tile in common.
+
+    """
+    def connect(self, camera_id, neighbor_id):
+        self.disconnect(camera_id, neighbor_id)
+        x0, y0 = np.maximum(self.boxes[camera_id, :2], self.boxes[neighbor_id, :2])
+        x1, y1 = np.minimum(self.boxes[camera_id, 2:], self.boxes[neighbor_id, 2:])
+        if x0 >= x1 or y0 >= y1:
+            return
+        box = int(x0), int(y0), int(x1), int(y1)
+        shared = self.get_mask(self.visible_masks, camera_id, box) & self.get_mask(self.visible_masks, neighbor_id, box)
+        shared_area = int(np.count_nonzero(shared))
+        if shared_area == 0:
+            return
+        self.shared_areas[camera_id][neighbor_id] = shared_area
+        self.shared_areas[neighbor_id][camera_id] = shared_area
+        for sender_id, receiver_id in ((camera_id, neighbor_id), (neighbor_id, camera_id)):
+            ys, xs = np.nonzero(shared & self.get_mask(self.edge_masks, sender_id, box))
+            self.boundaries[(sender_id, receiver_id)] = np.stack((xs + x0, ys + y0), axis=1)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - neighbor_id -> the id of another camera
+
+    Output:
+    - N/A
+
+    """
+    def disconnect(self, camera_id, neighbor_id):
+        self.shared_areas[camera_id].pop(neighbor_id, None)
+        self.shared_areas[neighbor_id].pop(camera_id, None)
+        self.boundaries.pop((camera_id, neighbor_id), None)
+        self.boundaries.pop((neighbor_id, camera_id), None)
+
+    """
+
+    Inputs:
+    - camera_ids -> the ids of cameras whose vision ranges changed
+
+    Output:
+    - N/A
+
+    Description:
+    This function recomputes every edge of the given cameras, for example after set_wall() in environment.py has
+    rebuilt their vision ranges. Edges between other cameras are kept. When lazy, the edges of the given cameras
+    are discarded and computed again when they are next needed.
+
+    """
+    def update_cameras(self, camera_ids):
+        if self.lazy:
+            # The edges are computed again from the new vision ranges the next time they are needed
+            for camera_id in camera_ids:
+                self.is_read[camera_id] = False
+                self.boxes[camera_id] = 0
+                self.visible_masks[camera_id] = self.edge_masks[camera_id] = None
+                for neighbor_id in list(self.shared_areas[camera_id]):
+                    self.disconnect(camera_id, neighbor_id)
+            changed = set(camera_ids)
+            self.connected_pairs = {pair for pair in self.connected_pairs if pair[0] not in changed and pair[1] not in changed}
+            return
+        for camera_id in camera_ids:
+            self.read_camera(camera_id)
+        for camera_id in camera_ids:
+            for neighbor_id in list(self.shared_areas[camera_id]):
+                self.disconnect(camera_id, neighbor_id)
+            for neighbor_id in self.get_overlapping_boxes(camera_id).tolist():
+                self.connect(camera_id, neighbor_id)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - neighbor_id -> the id of another camera
+
+    Output:
+    - (n,2) array of the (x,y) boundary tiles from the camera to the neighbor, or None if they are not connected
+
+    Description:
+    When lazy, the edge between the two cameras is computed the first time it is asked for, reading the vision
+    ranges of the cameras that were not read yet.
+
+    """
+    def get_boundary(self, camera_id, neighbor_id):
+        if self.lazy:
+            pair = min(camera_id, neighbor_id), max(camera_id, neighbor_id)
+            if pair not in self.connected_pairs:
+                for pair_camera_id in pair:
+                    if not self.is_read[pair_camera_id]:
+                        self.read_camera(pair_camera_id)
+                self.connect(*pair)
+                self.connected_pairs.add(pair)
+        return self.boundaries.get((camera_id, neighbor_id))
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - A list of the ids of every camera that can see a tile the camera can see, in increasing order
+
+    """
+    def get_neighbors(self, camera_id):
+        return sorted(self.shared_areas[camera_id])
+
+    """
+
+    Inputs:
+    - camera -> the camera that lost the tracked object
+    - object -> the tracked object
+    - neighbor -> another camera
+
+    Output:
+    - Boolean value indicating whether the neighbor is connected to the camera by boundary tiles that lie ahead of
+    the object's predicted motion (see guess_new_position() in utils.py). If the object is not moving, every
+    neighbor is ahead of it.
+
+    """
+    def is_ahead(self, camera, object, neighbor):
+        if camera.id == neighbor.id:
+            return False
+        boundary = self.get_boundary(camera.id, neighbor.id)
+        if boundary is None or len(boundary) == 0:
+            return False
+        if object.prev_pos is None:
+            return True
+        dx, dy = object.x - object.prev_pos[0], object.y - object.prev_pos[1]
+        return bool(np.any((boundary[:, 0] - object.x) * dx + (boundary[:, 1] - object.y) * dy >= 0))
+
+    """
+
+    Inputs:
+    - camera -> the camera that lost the tracked object
+    - object -> the tracked object
+    - candidates -> the candidates for taking over the tracking, in the order they would otherwise be tried
+    - key -> if not None, a function returning the camera of a candidate. Otherwise every candidate is a camera.
+
+    Output:
+    - The candidates reordered so that the candidates whose cameras are ahead of the object (see is_ahead()) come
+    first. Candidates keep their order otherwise.
+
+    """
+    def order_handoff_candidates(self, camera, object, candidates, key = None):
+        ahead = list()
+        behind = list()
+        for candidate in candidates:
+            neighbor = candidate if key is None else key(candidate)
+            (ahead if self.is_ahead(camera, object, neighbor) else behind).append(candidate)
+        return ahead + behind
+
+"""
+
+Inputs:
+- vision_range -> a camera's vision range
+
+Output:
+- The bounding box (x0, y0, x1, y1) of the tiles the camera can see, with exclusive ends. The box is empty
+(all zeros) if the camera cannot see any tile.
+
+"""
+def get_visible_box(vision_range):
+    visible = vision_range == 1
+    rows = np.flatnonzero(visible.any(axis=1))
+    if len(rows) == 0:
+        return 0, 0, 0, 0
+    columns = np.flatnonzero(visible.any(axis=0))
+    return columns[0], rows[0], columns[-1] + 1, rows[-1] + 1
+
+"""
+
+Inputs:
+- vision_range -> a camera's vision range
+- box -> a rectangle (x0, y0, x1, y1) of tiles with exclusive ends
+
+Output:
+- Boolean array of the rectangle where tiles are True if the camera can see them but cannot see one of their four
+neighbors (tiles next to the edge of the map count as well)
+
+"""
+def get_coverage_edge(vision_range, box):
+    x0, y0, x1, y1 = box
+    height, width = vision_range.shape
+    # The rectangle is grown by a tile on every side, and tiles outside of the map count as not visible
+    padded = np.zeros((y1 - y0 + 2, x1 - x0 + 2), dtype=bool)
+    top, left = max(y0 - 1, 0), max(x0 - 1, 0)
+    bottom, right = min(y1 + 1, height), min(x1 + 1, width)
+    padded[top - (y0 - 1):bottom - (y0 - 1), left - (x0 - 1):right - (x0 - 1)] = vision_range[top:bottom, left:right] == 1
+    inner = padded[1:-1, 1:-1]
+    surrounded = padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+    return inner & ~surrounded
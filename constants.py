@@ -8,15 +8,76 @@ execution of main.py.
 # Map/Environment file used to generate simulation
 MAP_NAME = "many_cameras.txt"
 
+# Algorithm used to build camera vision ranges. "bresenham" traces a line to every tile and reproduces the
+# original vision ranges exactly, while "shadowcast" uses symmetric shadow casting, which touches each tile once
+# and is much faster on large maps (see get_shadowcast_vision_range in utils.py for how the results differ).
+VISION_ALGORITHM = "bresenham"
+
+# Number of processes used to compute vision ranges. 1 computes them serially in the main process, and 0 uses
+# one process per CPU core.
+VISION_WORKERS = 1
+# Smallest number of cameras given to each of those processes. Maps with fewer than twice as many cameras are always
+# computed serially, since starting the processes and sending the results back costs more than it saves there.
+VISION_PARALLEL_MIN_CAMERAS = 16
+
+# If set to True, vision ranges are cached next to the map file and reused until the map changes
+VISION_CACHE = True
+
+# If set to True, a camera's vision range is only built the first time it is used, and vision ranges are kept in a
+# cache limited to VISION_MEMORY_LIMIT bytes (see vision_store.py) instead of being built for every camera at startup.
+VISION_LAZY = False
+VISION_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# When VISION_LAZY is True, only cameras within this many tiles of an object (measured like the position difference
+# used for matching) are checked for whether they can see it. Set to None to check every camera, which gives the same
+# results as building every vision range at startup.
+VISION_LAZY_RADIUS = 50
+
+# When VISION_LAZY is True, the vision ranges of this many cameras nearest to the tracking camera are built in a
+# background thread before they are needed. 0 disables prefetching.
+VISION_PREFETCH = 8
+
 # Multiplicative constants used for handshake matching
 POS_CONST = 0.1
 APPEARANCE_CONST = 1.0
 SIZE_CONST = 4.0
 
+# If True, when the tracking camera loses the tracked object, the cameras that received a handshake and are
+# connected to the tracking camera ahead of the object's motion in the camera graph (see camera_graph.py) are
+# checked before any other camera. When VISION_LAZY is True, graph edges are only computed for the cameras involved
+# in hand-offs
+HANDOFF_GRAPH = True
+
+# Handshakes are only matched against objects whose position differs from the handshake's predicted position
+# by at most MATCH_GATING_RADIUS tiles (measured like the position difference used for matching). Set to None
+# to match against every object.
+MATCH_GATING_RADIUS = 20
+
+# If True, handshake matching prints the position, appearance, and size difference of every object it compares.
+# This is very slow and is only meant for debugging.
+VERBOSE_MATCHING = False
+
+# If True, main.py times every stage of every frame (see profiler.py), prints a summary when the window is closed,
+# and writes the time of every frame to PROFILE_OUTPUT (as JSON if it ends in .json, CSV otherwise)
+PROFILE = False
+PROFILE_OUTPUT = "profile.csv"
+
+# If not None, main.py records the simulation to a trace file at this path, which can be replayed with replay.py
+TRACE_OUTPUT = None
+
+# Number of frames skipped by the up and down arrow keys when replaying a trace
+REPLAY_SEEK_FRAMES = 100
+
+# Size (in tiles) of the cells of the spatial index used to find objects near a position
+OBJECT_GRID_CELL_SIZE = 10
+
 # Defines the size of the simulation visual. For example, SCALE = 5 means that each square tile
 # in the environment is represented as a 5x5 group of pixels.
 SCALE = 6
 
+# Maximum number of pre-rendered camera vision overlays kept by the visualizer
+VISION_OVERLAY_CACHE_SIZE = 4
+
 # If set to false, the simulation pauses after each frame, requiring the user to press any button to continue to the next frame.
 AUTOPLAY = False
 
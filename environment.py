@@ -12,10 +12,98 @@ environment_format.txt to understand the format of the map file).
 """
 
 import constants
+import map_format
 import numpy as np
-import pygame
+import utils
 from camera import Camera
+from camera_graph import CameraGraph
+from collections import OrderedDict
 from object import Object
+from object_grid import ObjectGrid
+from object_store import ObjectStore
+
+# Largest number of changed regions of the screen for which redraw_handshake_visual() looks for the cameras and
+# handshake dots to redraw. Comparing every circle with more regions than this takes longer than drawing every circle.
+HANDSHAKE_REDRAW_MAX_RECTS = 128
+
+"""
+
+Inputs:
+- mask -> 2D boolean array of the same size as a map, indexed [y, x]
+- color -> the (r, g, b) color of tiles where mask is True
+
+Output:
+- A Pygame surface of the whole map (scaled by SCALE) where tiles in mask have the given color and
+every other pixel is transparent
+
+Description:
+The surface is built from a NumPy array of pixels with pygame.surfarray in a single call instead of
+drawing one rectangle per tile.
+
+"""
+def make_tile_surface(mask, color):
+    # Pygame is only imported when drawing so that headless simulations never load it
+    import pygame
+    # White is used as the transparent color since the map's background is white
+    transparent = (255, 255, 255)
+    pixels = np.full(mask.shape[::-1] + (3,), 255, dtype=np.uint8)
+    pixels[mask.T] = color
+    pixels = np.repeat(np.repeat(pixels, constants.SCALE, axis=0), constants.SCALE, axis=1)
+    surface = pygame.surfarray.make_surface(pixels)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    surface.set_colorkey(transparent)
+    return surface
+
+"""
+
+Inputs:
+- camera -> a camera
+- tracking_camera_id -> the id of the camera currently in charge of tracking the relevant object
+
+Output:
+- The color of the camera as drawn by update_handshake_visual()
+
+"""
+def get_camera_color(camera, tracking_camera_id):
+    if camera.id == tracking_camera_id:
+        return (255, 0, 0)
+    elif camera.handshake is not None:
+        return (255, 165, 0)
+    else:
+        return (0, 255, 0)
+
+"""
+
+Inputs:
+- center -> the (x,y) center of a circle in pixels
+- radius -> the radius of the circle in pixels
+
+Output:
+- A Pygame rectangle covering the circle
+
+"""
+def get_circle_rect(center, radius):
+    # Pygame is only imported when drawing so that headless simulations never load it
+    import pygame
+    return pygame.Rect(center[0] - radius, center[1] - radius, 2 * radius + 1, 2 * radius + 1)
+
+"""
+
+Inputs:
+- boxes -> (n,4) array of rectangles (x0, y0, x1, y1) with exclusive ends
+- other_boxes -> (m,4) array of rectangles in the same format
+
+Output:
+- Boolean array that is True for every rectangle of boxes overlapping a rectangle of other_boxes
+
+"""
+def get_box_overlaps(boxes, other_boxes):
+    return np.any(
+        (boxes[:, None, 0] < other_boxes[None, :, 2]) & (boxes[:, None, 2] > other_boxes[None, :, 0]) &
+        (boxes[:, None, 1] < other_boxes[None, :, 3]) & (boxes[:, None, 3] > other_boxes[None, :, 1]),
+        axis=1
+    )
 
 class Environment:
 
@@ -23,7 +111,30 @@ class Environment:
         self.size = self.width, self.height = (100, 100)
         self.map = np.zeros(self.size)
         self.objects = list()
+        # Movement state of every object in self.objects, which are views of its rows
+        self.object_store = ObjectStore([])
         self.cameras = list()
+        self.file_name = None
+        # Packed vision ranges of every camera (see packed_vision.py), whose visible bits are camera_visibility
+        self.vision_ranges = None
+        self.camera_visibility = None
+        # Bounding boxes of the tiles each camera reached, found from vision_ranges the first time a tile changes
+        # (see get_cameras_affected_by_tile())
+        self.reach_boxes = None
+        # Set instead of vision_ranges and camera_visibility when vision ranges are built lazily (see vision_store.py)
+        self.vision_store = None
+        # Built from the vision ranges the first time it is needed (see get_camera_graph())
+        self.camera_graph = None
+        # Maps (camera id, object id) to (object version, appearance) for the current frame (see get_object_appearance() in utils.py)
+        self.appearance_cache = dict()
+        self.object_grid = ObjectGrid(constants.OBJECT_GRID_CELL_SIZE)
+        # Pre-rendered layers used by draw(). Vision overlays are kept in least recently used order.
+        self.wall_surface = None
+        self.vision_overlays = OrderedDict()
+        self.surface_scale = None
+        # What draw_incremental() drew in the previous frame, and the pixel centers of the cameras it drew
+        self.previous_draw = None
+        self.camera_centers = None
         if file_name is not None:
             # Load from file (should always be this case)
             self.load_from_file(file_name)
@@ -39,54 +150,167 @@ class Environment:
 
     Description:
     This function reads the file described by file_name and
-    initializes this environment using the parsed information.
+    initializes this environment using the parsed information. Files ending
+    in .cmap are read as binary maps and every other file as a text map
+    (see map_format.py).
 
     """
     def load_from_file(self, file_name):
+        self.file_name = file_name
         map_file_path = "maps/" + file_name
-        f = open(map_file_path, "r")
-        content = f.readlines()
-        self.size = self.height, self.width = np.array(content[0].split()).astype(int)
-        self.map = np.zeros(self.size)
-        i = 0
-        for line in content[1:self.height + 1]:
-            self.map[i] = np.array(line.split())
-            i += 1
-        i = self.height + 1
+        if file_name.endswith(map_format.BINARY_MAP_EXTENSION):
+            walls, objects, cameras = map_format.read_binary_map(map_file_path)
+        else:
+            walls, objects, cameras = map_format.read_text_map(map_file_path)
+        self.map = walls
+        self.size = self.height, self.width = walls.shape
         self.objects = list()
-        objects_length = int(content[i])
-        i += 1
-        objects_processed = 0
-        while objects_processed < objects_length:
-            object_width, object_height = np.array(content[i].split()).astype(int)
-
-            i += 1
-            initial_visual = np.zeros((object_width, object_height))
-            a = 0
-            for line in content[i:object_height + i]:
-                initial_visual[a] = np.array(content[i].split()).astype(int)
-                a += 1
-                i += 1
-            object_path_length = int(content[i])
-            i += 1
-            initial_path = list()
-            for line in content[i:object_path_length + i]:
-                initial_path.append(np.array(content[i].split()).astype(int))
-                i += 1
-            o = Object(objects_processed, initial_visual, initial_path)
+        self.object_store = ObjectStore([initial_path for _, initial_path in objects])
+        self.object_grid = ObjectGrid(constants.OBJECT_GRID_CELL_SIZE)
+        for objects_processed, (initial_visual, initial_path) in enumerate(objects):
+            o = Object(objects_processed, initial_visual, initial_path, self.object_store, objects_processed)
             self.objects.append(o)
-            objects_processed += 1
+            self.object_grid.insert(o)
 
-        cameras_length = int(content[i])
         self.cameras = list()
-        cameras_processed = 0
-        for line in content[i + 1: cameras_length + i + 1]:
-            x, y = np.array(line.split()).astype(int)
+        for cameras_processed, (x, y) in enumerate(cameras):
             self.cameras.append(Camera(cameras_processed, x,y))
-            cameras_processed += 1
             
     """
     
+    Inputs:
+    - vision_ranges -> the packed vision ranges of every camera (see packed_vision.py), as built by
+    initialize_vision_ranges() in utils.py. They may be shared with other environments of the same map.
+
+    Output:
+    - N/A
+
+    Description:
+    This function makes vision_ranges the single store of every camera's vision range, so no camera holds a
+    copy of its own. Their visible bits are the reverse index camera_visibility, a bit-packed array of shape
+    (ceil(number of cameras / 8), height, width) in which bit i of the bytes at [:, y, x] is set if camera i
+    can see tile (x,y).
+
+    """
+    def set_vision_ranges(self, vision_ranges):
+        self.vision_ranges = vision_ranges
+        self.camera_visibility = vision_ranges.visible
+        self.reach_boxes = None
+        self.camera_graph = None
+        if self.vision_store is not None:
+            self.vision_store.close()
+            self.vision_store = None
+        for camera in self.cameras:
+            camera.vision_source = vision_ranges
+
+    """
+    
+    Inputs:
+    - vision_store -> a vision store of this environment's cameras
+
+    Output:
+    - N/A
+
+    Description:
+    This function makes every camera read its vision range from vision_store, which builds vision ranges
+    only when they are first used. There is no camera_visibility index in this case, so the cameras that can
+    see a tile are found by checking the vision ranges of the cameras within VISION_LAZY_RADIUS of it.
+
+    """
+    def set_vision_store(self, vision_store):
+        if self.vision_store is not None:
+            self.vision_store.close()
+        self.vision_store = vision_store
+        self.vision_ranges = None
+        self.reach_boxes = None
+        self.camera_graph = None
+        self.camera_visibility = None
+        for camera in self.cameras:
+            camera.vision_source = vision_store
+
+    """
+    
+    Inputs:
+    - N/A
+
+    Output:
+    - The camera graph of this environment (see camera_graph.py), which is built the first time it is needed. If
+    vision ranges are built lazily, its edges are only computed when hand-offs need them.
+
+    """
+    def get_camera_graph(self):
+        if self.camera_graph is None:
+            self.camera_graph = CameraGraph(self, lazy = self.vision_store is not None)
+        return self.camera_graph
+
+    """
+    
+    Inputs:
+    - positions -> a list of the (x,y) positions of every tracked object
+    - tracking_camera_ids -> a list of the ids of every tracking camera
+
+    Output:
+    - N/A
+
+    Description:
+    This function tells the vision store which parts of the map are in use, so that it evicts the vision ranges
+    of cameras far from the tracked objects first and prefetches the vision ranges of the VISION_PREFETCH
+    cameras nearest to each tracking camera. Nothing happens if vision ranges are not built lazily.
+
+    """
+    def focus_vision(self, positions, tracking_camera_ids):
+        if self.vision_store is None:
+            return
+        self.vision_store.set_focus(positions)
+        for camera_id in tracking_camera_ids:
+            self.vision_store.prefetch(camera_id, constants.VISION_PREFETCH)
+
+    """
+    
+    Inputs:
+    - x -> x position of a tile
+    - y -> y position of a tile
+
+    Output:
+    - Array of the ids of every camera that can see tile (x,y), in increasing order
+
+    """
+    def get_cameras_seeing_tile(self, x, y):
+        if self.vision_store is not None:
+            return self.get_cameras_seeing_region(x, y, x + 1, y + 1)
+        return np.flatnonzero(np.unpackbits(self.camera_visibility[:, y, x], count=len(self.cameras)))
+
+    """
+    
+    Inputs:
+    - x0, y0 -> the top left corner of a rectangle of tiles (inclusive)
+    - x1, y1 -> the bottom right corner of the rectangle (exclusive)
+
+    Output:
+    - Array of the ids of every camera that can see at least one tile in the rectangle, in increasing order
+
+    Description:
+    This function unions the camera_visibility index over the rectangle, so its cost depends on the size
+    of the rectangle and not on how many tiles each camera can see. If vision ranges are built lazily, only
+    the cameras within VISION_LAZY_RADIUS of the rectangle are checked.
+
+    """
+    def get_cameras_seeing_region(self, x0, y0, x1, y1):
+        if self.vision_store is not None:
+            camera_ids = self.vision_store.get_nearby_cameras(x0, y0, x1, y1, constants.VISION_LAZY_RADIUS)
+            y0, y1, x0, x1 = max(y0, 0), max(y1, 0), max(x0, 0), max(x1, 0)
+            return np.array(
+                [i for i in camera_ids.tolist() if np.any(self.vision_store.get(i)[y0:y1, x0:x1] == 1)],
+                dtype=np.intp
+            )
+        region = self.camera_visibility[:, max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)]
+        if region.shape[1] == 0 or region.shape[2] == 0:
+            return np.zeros(0, dtype=np.intp)
+        visibility = np.bitwise_or.reduce(region.reshape(region.shape[0], -1), axis=1)
+        return np.flatnonzero(np.unpackbits(visibility, count=len(self.cameras)))
+
+    """
+    
     Inputs:
     - screen -> The Pygame window used for display
     - tracking_camera_id -> The id of the camera currently in charge of
@@ -108,13 +332,10 @@ class Environment:
 
     """
     def update_handshake_visual(self, screen, tracking_camera_id):
+        # Pygame is only imported when drawing so that headless simulations never load it
+        import pygame
         for camera in self.cameras:
-            if camera.id == tracking_camera_id:
-                color = (255, 0, 0)
-            elif camera.handshake is not None:
-                color = (255, 165, 0)
-            else:
-                color = (0, 255, 0)
+            color = get_camera_color(camera, tracking_camera_id)
             pygame.draw.circle(screen, 
                 color, 
                 (int((camera.x + 0.5) * constants.SCALE), int((camera.y + 0.5) * constants.SCALE)),
@@ -138,6 +359,293 @@ class Environment:
 
     """
     
+    Inputs:
+    - screen -> The Pygame window used for display
+    - rects -> a list of Pygame rectangles of screen that were repainted
+    - camera_colors -> the color of every camera (see get_camera_color())
+    - dots -> a list of (camera id, center) of the yellow dot of every camera with a handshake, in increasing
+    order of camera id
+    
+    Output:
+    - N/A
+
+    Description:
+    This function has the same result as update_handshake_visual() within rects, and leaves the rest of screen as
+    it was. Only the circles overlapping rects are drawn, along with every circle overlapping a drawn circle so that
+    circles drawn later stay on top, in the order update_handshake_visual() draws them. Drawing a circle outside of
+    rects does not change anything there, since the circles drawn after it are drawn again as well. Every circle is
+    drawn if there are more than HANDSHAKE_REDRAW_MAX_RECTS rectangles.
+
+    """
+    def redraw_handshake_visual(self, screen, rects, camera_colors, dots):
+        # Pygame is only imported when drawing so that headless simulations never load it
+        import pygame
+        rects = [rect for rect in rects if rect.width > 0 and rect.height > 0]
+        if len(rects) == 0:
+            return
+        scale = constants.SCALE
+        num_cameras, num_dots = len(self.cameras), len(dots)
+        dot_camera_ids = np.array([camera_id for camera_id, _ in dots], dtype=np.int64)
+        dot_centers = np.array([center for _, center in dots], dtype=np.int64).reshape(-1, 2)
+        # Every circle in the order update_handshake_visual() draws them: each camera is followed by its dot, and
+        # every dot is drawn once more at the end
+        centers = np.concatenate((self.camera_centers, dot_centers, dot_centers))
+        radii = np.repeat([max(int(scale / 2), 3), max(int(scale / 2), 5), max(int(scale / 2), 5)], [num_cameras, num_dots, num_dots])
+        order = np.concatenate((2 * np.arange(num_cameras), 2 * dot_camera_ids + 1, 2 * num_cameras + np.arange(num_dots)))
+        redrawn = np.ones(len(centers), dtype=bool)
+        if len(rects) <= HANDSHAKE_REDRAW_MAX_RECTS:
+            # Bounding boxes (x0, y0, x1, y1) with exclusive ends, matching get_circle_rect()
+            circle_boxes = np.concatenate((centers - radii[:, None], centers + radii[:, None] + 1), axis=1)
+            boxes = np.array([tuple(rect) for rect in rects], dtype=np.int64)
+            boxes[:, 2:] += boxes[:, :2]
+            redrawn = get_box_overlaps(circle_boxes, boxes)
+            added = redrawn
+            while np.any(added):
+                added = get_box_overlaps(circle_boxes, circle_boxes[added]) & ~redrawn
+                redrawn |= added
+        circles = np.flatnonzero(redrawn)
+        for i in circles[np.argsort(order[circles])].tolist():
+            color = camera_colors[i] if i < num_cameras else (255, 255, 0)
+            pygame.draw.circle(screen, color, centers[i].tolist(), int(radii[i]))
+
+    """
+    
+    Inputs:
+    - camera -> a camera
+    - vision_range -> the camera's vision range
+    - x -> x position of a tile
+    - y -> y position of a tile
+
+    Output:
+    - Boolean value indicating whether the camera's vision range may change if the tile changes between a wall
+    and floor
+
+    Description:
+    A camera is affected if its Breadth-First Search may reach the tile (the camera can see a tile next to it, or
+    reached it without seeing it), or if any tile the camera reached has a line of sight that may pass through the
+    tile. With the "shadowcast" algorithm, light also passes through floor tiles that are not marked visible, so
+    every camera that reached a tile within two tiles of the change is treated as affected.
+
+    """
+    def is_camera_affected_by_tile(self, camera, vision_range, x, y):
+        if constants.VISION_ALGORITHM == "shadowcast":
+            if np.any(vision_range[max(y - 2, 0):y + 3, max(x - 2, 0):x + 3]):
+                return True
+        elif vision_range[y, x] == 2 or np.any(vision_range[max(y - 1, 0):y + 2, max(x - 1, 0):x + 2] == 1):
+            return True
+        ys, xs = np.nonzero(vision_range)
+        return bool(np.any(utils.may_line_pass_through_tile(camera.pos, (x, y), xs, ys)))
+
+    """
+    
+    Inputs:
+    - x -> x position of a tile
+    - y -> y position of a tile
+
+    Output:
+    - Array of the ids of every camera whose vision range may change if the tile changes between a wall and floor,
+    in increasing order (see is_camera_affected_by_tile())
+
+    Description:
+    Every line of sight a camera traces stays within the bounding box of the camera and the tiles it reached, so
+    cameras whose box, grown by the two tiles of margin used by is_camera_affected_by_tile(), does not contain the
+    tile are skipped without unpacking their vision ranges. If vision ranges are built lazily, only cameras whose
+    vision range is currently cached are returned, since every other vision range will be built from the changed
+    map anyway.
+
+    """
+    def get_cameras_affected_by_tile(self, x, y):
+        if self.vision_store is not None:
+            vision_ranges = sorted(self.vision_store.get_cached())
+        elif self.vision_ranges is not None:
+            if self.reach_boxes is None:
+                self.reach_boxes = self.vision_ranges.get_reach_boxes()
+            boxes = self.reach_boxes
+            positions = np.array([camera.pos for camera in self.cameras], dtype=np.int64).reshape(-1, 2)
+            near = (
+                (boxes[:, 2] > boxes[:, 0]) &
+                (x >= np.minimum(boxes[:, 0], positions[:, 0]) - 2) & (x < np.maximum(boxes[:, 2], positions[:, 0] + 1) + 2) &
+                (y >= np.minimum(boxes[:, 1], positions[:, 1]) - 2) & (y < np.maximum(boxes[:, 3], positions[:, 1] + 1) + 2)
+            )
+            vision_ranges = ((i, self.vision_ranges.get(i)) for i in np.flatnonzero(near).tolist())
+        else:
+            vision_ranges = []
+        return np.array(
+            [i for i, vision_range in vision_ranges if self.is_camera_affected_by_tile(self.cameras[i], vision_range, x, y)],
+            dtype=np.intp
+        )
+
+    """
+    
+    Inputs:
+    - x -> x position of a tile
+    - y -> y position of a tile
+    - is_wall -> True to turn the tile into a wall, False to turn it into floor
+
+    Output:
+    - Array of the ids of every camera whose vision range was rebuilt
+
+    Description:
+    This function changes a tile of the map while the simulation is running (for example to open a door or place
+    an obstacle) and keeps everything derived from the map up to date. Only the vision ranges of the cameras
+    returned by get_cameras_affected_by_tile() are rebuilt, each with update_vision_range() in utils.py, and only
+    their bits of the camera_visibility index and their edges of the camera graph are recomputed. Cached
+    appearances and the pre-rendered walls and vision overlays of the affected cameras are discarded. The vision
+    cache file of the map no longer matches the map, so it is ignored from then on.
+
+    A rebuilt vision range still walks the camera's whole Breadth-First Search, since opening or closing a tile can
+    change which tiles are reached anywhere behind it. Only the lines of sight in the sector behind the tile are
+    traced again, and every other tile reuses its old result (see update_vision_range() in utils.py).
+
+    A ValueError is raised if (x,y) is not on the map.
+
+    """
+    def set_wall(self, x, y, is_wall):
+        height, width = self.map.shape
+        if not (0 <= x < width and 0 <= y < height):
+            raise ValueError("Tile " + str((x, y)) + " is outside of the " + str(width) + "x" + str(height) + " map")
+        if (self.map[y, x] > 0) == is_wall:
+            return np.zeros(0, dtype=np.intp)
+        if self.vision_store is not None:
+            # Vision ranges being prefetched were built from the old map, so they have to be cached before checking
+            self.vision_store.wait_for_prefetches()
+        affected = self.get_cameras_affected_by_tile(x, y)
+        self.map[y, x] = 1 if is_wall else 0
+        self.appearance_cache.clear()
+        self.wall_surface = None
+        self.previous_draw = None
+        for camera_id in affected.tolist():
+            self.vision_overlays.pop(camera_id, None)
+
+        if self.vision_store is not None:
+            self.vision_store.discard(affected.tolist())
+            if self.camera_graph is not None:
+                self.camera_graph.update_cameras(affected.tolist())
+            return affected
+        if self.vision_ranges is None:
+            return affected
+        if not self.vision_ranges.is_writeable():
+            # Vision ranges loaded from the vision cache are read-only, so they are copied before the first change
+            camera_graph, reach_boxes = self.camera_graph, self.reach_boxes
+            self.set_vision_ranges(self.vision_ranges.copy())
+            self.camera_graph, self.reach_boxes = camera_graph, reach_boxes
+        for camera_id in affected.tolist():
+            self.vision_ranges.set(camera_id, utils.update_vision_range(self.cameras[camera_id], (x, y), self))
+        if len(affected) > 0:
+            self.reach_boxes[affected] = self.vision_ranges.get_reach_boxes(affected)
+        if self.camera_graph is not None:
+            self.camera_graph.update_cameras(affected.tolist())
+        return affected
+
+    """
+    
+    Inputs:
+    - x -> x position of a tile
+    - y -> y position of a tile
+
+    Output:
+    - Array of the ids of every camera whose vision range was rebuilt (see set_wall())
+
+    """
+    def add_wall(self, x, y):
+        return self.set_wall(x, y, True)
+
+    """
+    
+    Inputs:
+    - x -> x position of a tile
+    - y -> y position of a tile
+
+    Output:
+    - Array of the ids of every camera whose vision range was rebuilt (see set_wall())
+
+    """
+    def remove_wall(self, x, y):
+        return self.set_wall(x, y, False)
+
+    """
+    
+    Inputs:
+    - N/A
+    
+    Output:
+    - N/A
+
+    Description:
+    This function progresses the simulation forward by a frame by moving every object along its path,
+    without drawing anything. Every object is moved at once by the object store, and only the objects
+    that moved are updated in the object grid. Every object appearance cached during the previous frame
+    is discarded.
+
+    """
+    def step(self):
+        self.appearance_cache.clear()
+        moved = self.object_store.step()
+        self.object_grid.move_all(moved, self.object_store.positions[moved])
+
+    """
+    
+    Inputs:
+    - N/A
+
+    Output:
+    - N/A
+
+    Description:
+    This function discards every cached layer if SCALE has changed since the layers were rendered.
+
+    """
+    def check_surface_scale(self):
+        if self.surface_scale != constants.SCALE:
+            self.wall_surface = None
+            self.vision_overlays.clear()
+            self.surface_scale = constants.SCALE
+
+    """
+    
+    Inputs:
+    - N/A
+
+    Output:
+    - A Pygame surface of the whole map where walls are black and every other pixel is transparent
+
+    Description:
+    The surface is rendered once and reused by every later frame.
+
+    """
+    def get_wall_surface(self):
+        self.check_surface_scale()
+        if self.wall_surface is None:
+            self.wall_surface = make_tile_surface(self.map > 0, (0, 0, 0))
+        return self.wall_surface
+
+    """
+    
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - A Pygame surface of the whole map where the camera's visible tiles are pink and every other pixel
+    is transparent
+
+    Description:
+    Overlays are rendered once per camera and kept in a cache of at most VISION_OVERLAY_CACHE_SIZE
+    overlays. When the cache is full, the overlay that was used least recently is evicted.
+
+    """
+    def get_vision_overlay(self, camera_id):
+        self.check_surface_scale()
+        if camera_id in self.vision_overlays:
+            self.vision_overlays.move_to_end(camera_id)
+            return self.vision_overlays[camera_id]
+        overlay = make_tile_surface(self.cameras[camera_id].vision_range == 1, (255, 114, 118))
+        self.vision_overlays[camera_id] = overlay
+        while len(self.vision_overlays) > max(1, constants.VISION_OVERLAY_CACHE_SIZE):
+            self.vision_overlays.popitem(last=False)
+        return overlay
+
+    """
+    
     Inputs:
     - screen -> The Pygame window used for display
     - tracking_camera_id -> The id of the camera currently in charge of
@@ -148,36 +656,135 @@ class Environment:
     - N/A
 
     Description:
-    This function progresses the simulation forward by a frame, then it updates 
-    screen with visuals describing the state of the map and the environment's objects. 
+    This function updates screen with visuals describing the state of the map and the environment's objects. 
     The visual colors are as follows:
     - Black -> opaque wall
     - Pink -> visual range of the current tracking camera
     - Blue Outline -> correct object to be tracked
     - Purple Outline -> object currently being tracked (only present if different from correct object to be tracked)
 
+    The walls and vision ranges are not drawn tile by tile. They are blitted from the layers cached by
+    get_wall_surface() and get_vision_overlay().
+
     """
-    def update(self, screen, tracking_camera_id, tracking_object_id):
+    def draw(self, screen, tracking_camera_id, tracking_object_id):
         screen.fill((255, 255, 255))
-        for y in range(self.map.shape[0]):
-            for x in range(self.map.shape[1]):
-                if self.map[y,x] > 0:
-                    pygame.draw.rect(
-                        screen,
-                        (0, 0, 0),
-                        (x*constants.SCALE, y*constants.SCALE, constants.SCALE, constants.SCALE)
-                    )
-                elif self.cameras[tracking_camera_id].vision_range[y,x] == 1:
-                    pygame.draw.rect(
-                        screen,
-                        (255, 114, 118),
-                        (x*constants.SCALE, y*constants.SCALE, constants.SCALE, constants.SCALE)
-                    )
+        screen.blit(self.get_vision_overlay(tracking_camera_id), (0, 0))
+        screen.blit(self.get_wall_surface(), (0, 0))
 
         for i in range(len(self.objects)):
             if i == 0:
-                self.objects[i].update(screen, True, False)
+                self.objects[i].draw(screen, True, False)
             elif i == tracking_object_id:
-                self.objects[i].update(screen, False, True)
+                self.objects[i].draw(screen, False, True)
             else:
-                self.objects[i].update(screen, False, False)
+                self.objects[i].draw(screen, False, False)
+
+    """
+    
+    Inputs:
+    - screen -> The Pygame window used for display
+    - tracking_camera_id -> The id of the camera currently in charge of
+    tracking the relevant object
+    - tracking_object_id -> The id of the object currently being tracked
+    
+    Output:
+    - A list of the Pygame rectangles of screen that changed, to be passed to pygame.display.update()
+
+    Description:
+    This function has the same result as calling draw() followed by update_handshake_visual(), but only
+    redraws the parts of screen that changed since the previous call. The regions that changed are:
+    - the previous and current rectangles of every object that moved, turned, or gained or lost an outline
+    - the circles of cameras whose color changed
+    - the previous and current predicted positions of the tracked object
+    Every object overlapping a changed region is redrawn as well (and its rectangle is added to the changed
+    regions, so that objects drawn on top of it stay on top). Cameras and handshake dots are only redrawn where
+    they overlap a changed region (see redraw_handshake_visual()). The whole screen is redrawn on the first call
+    and whenever the tracking camera, the size of screen, or SCALE changes.
+
+    """
+    def draw_incremental(self, screen, tracking_camera_id, tracking_object_id):
+        # Pygame is only imported when drawing so that headless simulations never load it
+        import pygame
+        scale = constants.SCALE
+        object_states = list()
+        for i, object in enumerate(self.objects):
+            object_width, object_height = object.rotate(object.orientation).shape
+            rect = pygame.Rect(int(object.x * scale), int(object.y * scale), scale * object_width, scale * object_height)
+            object_states.append((rect, object.orientation, i == 0, i == tracking_object_id))
+        camera_colors = [get_camera_color(camera, tracking_camera_id) for camera in self.cameras]
+        dots = [
+            (camera.id, (int(camera.handshake[0][0] * scale), int(camera.handshake[0][1] * scale)))
+            for camera in self.cameras if camera.handshake is not None
+        ]
+        dot_rects = [get_circle_rect(center, max(int(scale / 2), 5)) for _, center in dots]
+        view = tracking_camera_id, screen.get_size(), scale, len(self.objects), len(self.cameras)
+        previous = self.previous_draw
+        self.previous_draw = view, object_states, camera_colors, dot_rects
+
+        if previous is None or previous[0] != view:
+            self.camera_centers = np.array(
+                [(int((camera.x + 0.5) * scale), int((camera.y + 0.5) * scale)) for camera in self.cameras], dtype=np.int64
+            ).reshape(-1, 2)
+            self.draw(screen, tracking_camera_id, tracking_object_id)
+            self.update_handshake_visual(screen, tracking_camera_id)
+            return [screen.get_rect()]
+
+        previous_view, previous_object_states, previous_camera_colors, previous_dot_rects = previous
+        dirty = list()
+        for previous_state, state in zip(previous_object_states, object_states):
+            if previous_state != state:
+                dirty.append(previous_state[0])
+                dirty.append(state[0])
+        for center, previous_color, color in zip(self.camera_centers.tolist(), previous_camera_colors, camera_colors):
+            if previous_color != color:
+                dirty.append(get_circle_rect(center, max(int(scale / 2), 3)))
+        if previous_dot_rects != dot_rects:
+            dirty.extend(previous_dot_rects)
+            dirty.extend(dot_rects)
+        if len(dirty) == 0:
+            return dirty
+
+        # Objects overlapping a dirty region are redrawn, which makes their own rectangles dirty too
+        redrawn = set()
+        grew = True
+        while grew:
+            grew = False
+            for i, state in enumerate(object_states):
+                if i not in redrawn and state[0].collidelist(dirty) != -1:
+                    redrawn.add(i)
+                    dirty.append(state[0])
+                    grew = True
+
+        # Regions are clipped to the screen so that blitting the same area of each layer stays aligned
+        dirty = [rect.clip(screen.get_rect()) for rect in dirty]
+        overlay = self.get_vision_overlay(tracking_camera_id)
+        walls = self.get_wall_surface()
+        for rect in dirty:
+            screen.fill((255, 255, 255), rect)
+            screen.blit(overlay, rect, rect)
+            screen.blit(walls, rect, rect)
+        for i in sorted(redrawn):
+            self.objects[i].draw(screen, object_states[i][2], not object_states[i][2] and object_states[i][3])
+        self.redraw_handshake_visual(screen, dirty, camera_colors, dots)
+        return dirty
+
+    """
+    
+    Inputs:
+    - screen -> The Pygame window used for display
+    - tracking_camera_id -> The id of the camera currently in charge of
+    tracking the relevant object
+    - tracking_object_id -> The id of the object currently being tracked
+    
+    Output:
+    - N/A
+
+    Description:
+    This function progresses the simulation forward by a frame with step(), then it updates 
+    screen with draw().
+
+    """
+    def update(self, screen, tracking_camera_id, tracking_object_id):
+        self.step()
+        self.draw(screen, tracking_camera_id, tracking_object_id)
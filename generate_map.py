@@ -0,0 +1,235 @@
+"""
+
+This file generates random maps for testing how the simulation scales. Every part of a map
+(walls, cameras and objects) is drawn from a random number generator seeded with --seed, so the
+same arguments always produce the same map.
+
+For example, the following creates maps/generated.txt and maps/generated.cmap with 1000 cameras
+and 1000 objects in a 500x500 map of rooms:
+
+    python generate_map.py generated --preset 1k --format both
+
+Run "python generate_map.py --help" for every parameter.
+
+"""
+
+import argparse
+import map_format
+import numpy as np
+
+# Parameters of commonly used workloads, which can be overridden by any argument given on the command line
+PRESETS = {
+    "small": dict(height=100, width=100, cameras=10, objects=10),
+    "1k": dict(height=500, width=500, cameras=1000, objects=1000),
+    "10k": dict(height=1000, width=1000, cameras=10000, objects=1000),
+}
+
+DEFAULTS = dict(
+    height=100,
+    width=100,
+    layout="rooms",
+    room_size=25,
+    door_size=4,
+    wall_density=0.02,
+    cameras=10,
+    camera_placement="random",
+    objects=10,
+    max_object_size=3,
+    path_length=6,
+    min_speed=2,
+    max_speed=20,
+    seed=0,
+)
+
+ORIENTATIONS = (0, 90, 180, 270)
+
+
+"""
+
+Inputs:
+- rng -> NumPy random number generator
+- height -> number of rows of the map
+- width -> number of columns of the map
+- layout -> "open" for a map without rooms, or "rooms" for a grid of rooms connected by doors
+- room_size -> distance between the walls of neighboring rooms
+- door_size -> width of the opening in each wall between two rooms
+- wall_density -> approximate fraction of the map covered by randomly placed blocks of wall
+
+Output:
+- 2D array of the map, where walls are 1 and every other tile is 0
+
+"""
+def generate_walls(rng, height, width, layout, room_size, door_size, wall_density):
+    walls = np.zeros((height, width), dtype=np.uint8)
+    if layout == "rooms":
+        for y in range(room_size, height, room_size):
+            walls[y, :] = 1
+            for x0 in range(0, width, room_size):
+                x1 = min(x0 + room_size, width)
+                door = rng.integers(x0, max(x0 + 1, x1 - door_size))
+                walls[y, door:door + door_size] = 0
+        for x in range(room_size, width, room_size):
+            walls[:, x] = 1
+            for y0 in range(0, height, room_size):
+                y1 = min(y0 + room_size, height)
+                door = rng.integers(y0, max(y0 + 1, y1 - door_size))
+                walls[door:door + door_size, x] = 0
+    elif layout != "open":
+        raise ValueError("unknown layout " + layout)
+
+    # Blocks are between 1x1 and 3x3 tiles, so each one covers 4 tiles on average
+    blocks = int(wall_density * height * width / 4)
+    block_heights = rng.integers(1, 4, blocks)
+    block_widths = rng.integers(1, 4, blocks)
+    block_ys = rng.integers(0, height, blocks)
+    block_xs = rng.integers(0, width, blocks)
+    for y, x, block_height, block_width in zip(block_ys, block_xs, block_heights, block_widths):
+        walls[y:y + block_height, x:x + block_width] = 1
+    return walls
+
+"""
+
+Inputs:
+- rng -> NumPy random number generator
+- walls -> 2D array of the map
+- count -> number of cameras
+- placement -> "random" to place cameras anywhere, or "grid" to spread cameras evenly across the map
+
+Output:
+- A list of (x,y) tuples of camera positions, all of which are on tiles without walls
+
+"""
+def generate_cameras(rng, walls, count, placement):
+    open_ys, open_xs = np.nonzero(walls == 0)
+    if count > len(open_ys):
+        raise ValueError("the map only has room for " + str(len(open_ys)) + " cameras")
+    if placement == "random":
+        chosen = rng.choice(len(open_ys), count, replace=False)
+        return [(int(open_xs[i]), int(open_ys[i])) for i in chosen]
+    if placement != "grid":
+        raise ValueError("unknown camera placement " + placement)
+
+    height, width = walls.shape
+    columns = max(1, int(round(np.sqrt(count * width / height))))
+    rows = -(-count // columns)
+    cameras = list()
+    taken = set()
+    for i in range(count):
+        y = int((i // columns + 0.5) * height / rows)
+        x = int((i % columns + 0.5) * width / columns)
+        # Grid points that land on a wall or an existing camera are moved to a random open tile
+        while walls[y, x] != 0 or (x, y) in taken:
+            j = rng.integers(len(open_ys))
+            x, y = int(open_xs[j]), int(open_ys[j])
+        taken.add((x, y))
+        cameras.append((x, y))
+    return cameras
+
+"""
+
+Inputs:
+- rng -> NumPy random number generator
+- walls -> 2D array of the map
+- count -> number of objects
+- max_object_size -> largest width (and height) of an object
+- path_length -> largest number of points on an object's path
+- min_speed -> fewest frames an object takes to move between two points of its path
+- max_speed -> most frames an object takes to move between two points of its path
+
+Output:
+- A list of (visual, path) tuples in the same form as map_format.read_text_map()
+
+Description:
+Each object gets a random square visual and a path between random points. Points are chosen so the
+object fits within the map in any orientation, preferring points where the object does not overlap
+a wall. Objects can still cross walls while moving between points.
+
+"""
+def generate_objects(rng, walls, count, max_object_size, path_length, min_speed, max_speed):
+    height, width = walls.shape
+    objects = list()
+    for _ in range(count):
+        # Non-square visuals are not supported by the text map format
+        size = int(rng.integers(1, max_object_size + 1))
+        visual = rng.integers(1, 13, (size, size)).astype(np.float64)
+        path = list()
+        for _ in range(int(rng.integers(2, max(2, path_length) + 1))):
+            for _ in range(10):
+                x = int(rng.integers(0, width - size + 1))
+                y = int(rng.integers(0, height - size + 1))
+                if not walls[y:y + size, x:x + size].any():
+                    break
+            speed = int(rng.integers(min_speed, max_speed + 1))
+            orientation = int(rng.choice(ORIENTATIONS))
+            path.append(np.array([x, y, speed, orientation]))
+        objects.append((visual, path))
+    return objects
+
+"""
+
+Inputs:
+- Any of the keys of DEFAULTS
+
+Output:
+- A 3-tuple of (walls, objects, cameras) in the same form as map_format.read_text_map()
+
+"""
+def generate_map(**parameters):
+    parameters = dict(DEFAULTS, **parameters)
+    rng = np.random.default_rng(parameters["seed"])
+    walls = generate_walls(
+        rng,
+        parameters["height"],
+        parameters["width"],
+        parameters["layout"],
+        parameters["room_size"],
+        parameters["door_size"],
+        parameters["wall_density"],
+    )
+    cameras = generate_cameras(rng, walls, parameters["cameras"], parameters["camera_placement"])
+    objects = generate_objects(
+        rng,
+        walls,
+        parameters["objects"],
+        parameters["max_object_size"],
+        parameters["path_length"],
+        parameters["min_speed"],
+        parameters["max_speed"],
+    )
+    return walls, objects, cameras
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random map within the maps folder.")
+    parser.add_argument("name", help="name of the map, without an extension")
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="start from the parameters of a preset workload")
+    parser.add_argument("--format", choices=("text", "binary", "both"), default="text", help="map formats to write")
+    parser.add_argument("--height", type=int)
+    parser.add_argument("--width", type=int)
+    parser.add_argument("--layout", choices=("open", "rooms"))
+    parser.add_argument("--room-size", type=int)
+    parser.add_argument("--door-size", type=int)
+    parser.add_argument("--wall-density", type=float)
+    parser.add_argument("--cameras", type=int)
+    parser.add_argument("--camera-placement", choices=("random", "grid"))
+    parser.add_argument("--objects", type=int)
+    parser.add_argument("--max-object-size", type=int)
+    parser.add_argument("--path-length", type=int)
+    parser.add_argument("--min-speed", type=int)
+    parser.add_argument("--max-speed", type=int)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    parameters = dict(PRESETS.get(args.preset, {}))
+    for key in DEFAULTS:
+        if getattr(args, key) is not None:
+            parameters[key] = getattr(args, key)
+    walls, objects, cameras = generate_map(**parameters)
+    if args.format in ("text", "both"):
+        map_format.write_text_map("maps/" + args.name + ".txt", walls, objects, cameras)
+        print("maps/" + args.name + ".txt")
+    if args.format in ("binary", "both"):
+        map_format.write_binary_map("maps/" + args.name + map_format.BINARY_MAP_EXTENSION, walls, objects, cameras)
+        print("maps/" + args.name + map_format.BINARY_MAP_EXTENSION)
+
+if __name__ == "__main__":
+    main()
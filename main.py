@@ -12,77 +12,88 @@ matching algorithm. The pseudocode for the algorithm is as follows:
     c) For each neighbor of c as c2,
         i) If the object is in c2's vision range, send a handshake to c2
 
+In step 3a, only the cameras that received a handshake are checked, and if HANDOFF_GRAPH is True, the
+cameras that the object is moving towards are checked first (see camera_graph.py).
+
+Steps 2 and 3 are implemented by Simulator in simulator.py, which can also be ran without any visuals.
+
 When running this file, a Pygame window should open after a few seconds. If AUTOPLAY is off, you will
 need to manually step through frames by clicking on any button while focused on the window.
 
 """
 
 import constants
+import profiler
 import pygame
+import replay
 import sys
 import utils
 from environment import Environment
+from simulator import Simulator
+
+"""
+
+Inputs:
+- recorder -> the TraceRecorder recording the simulation, or None if it is not being recorded
+
+Output:
+- N/A
+
+Description:
+This function closes the window and exits, first writing the trace of the simulation if it is being recorded
+and reporting its profile if PROFILE is True.
+
+"""
+def quit_simulation(recorder):
+    pygame.quit()
+    if recorder is not None:
+        recorder.close()
+    if profiler.is_enabled():
+        profiler.disable()
+        profiler.print_summary()
+        profiler.write_frames(constants.PROFILE_OUTPUT)
+    sys.exit()
+
+def main():
+    # 1) Initialize the vision ranges of each camera
+    environment = Environment(constants.MAP_NAME)
+    utils.initialize_vision_ranges(environment)
+
+    pygame.init()
+
+    window = pygame.display.set_mode((environment.size[1] * constants.SCALE, environment.size[0] * constants.SCALE))
+    clock = pygame.time.Clock()
+
+    # 2) c = arbitrary camera that can see the tracked object
+    simulator = Simulator(environment, tracked_object_id = 0)
+    if constants.PROFILE:
+        profiler.enable([Simulator])
+    recorder = None if constants.TRACE_OUTPUT is None else replay.TraceRecorder(constants.TRACE_OUTPUT, environment)
+
+    # 3) For each frame update,
+    while True:
+        result = simulator.step()
+        if recorder is not None:
+            recorder.record(result.tracking_camera_id, result.tracked_object_id, simulator.handshake_receivers)
+        # Only the parts of the window that changed are redrawn and sent to the display
+        changed_rects = environment.draw_incremental(window, simulator.tracking_camera.id, simulator.tracked_object_id)
+        pygame.display.update(changed_rects)
+        clock.tick(constants.FPS)
+        
+        progress = constants.AUTOPLAY
 
-# 1) Initialize the vision ranges of each camera
-environment = Environment(constants.MAP_NAME)
-utils.initialize_vision_ranges(environment)
-
-pygame.init()
-
-window = pygame.display.set_mode((environment.size[1] * constants.SCALE, environment.size[0] * constants.SCALE))
-clock = pygame.time.Clock()
-
-# 2) c = arbitrary camera that can see the tracked object
-c = None
-tracked_object_id = 0
-for camera in environment.cameras:
-    if utils.can_camera_see_object(camera, environment.objects[tracked_object_id], environment):
-        c = camera
-        break
-
-# 3) For each frame update,
-while True:
-    # a) If c cannot see the tracked object, check each camera c2 that recently received a handshake
-    if not utils.can_camera_see_object(c, environment.objects[tracked_object_id], environment):
-        for camera in environment.cameras:
-            # i) If c2 can see the tracked object, set c = c2 and break the loop
-            if camera.handshake is not None:
-                best_match = utils.get_best_object_match(camera, environment.objects, camera.handshake[0], camera.handshake[1], environment)
-                if best_match is not None:
-                    c = camera
-                    tracked_object_id = best_match.id
-                    break
-    
-    # b) Record the tracked object's location and visual representation
-    utils.reset_handshakes(environment.cameras)
-    environment.update(window, c.id, tracked_object_id)
-    tracked_pos = environment.objects[tracked_object_id].pos
-    tracked_visual = utils.get_object_appearance(c, environment.objects[tracked_object_id], environment)
-
-    # c) For each neighbor of c as c2,
-    for camera in environment.cameras:
-        # i) If the object is in c2's vision range, send a handshake to c2
-        if c.id != camera.id and utils.can_camera_see_object(camera, environment.objects[tracked_object_id], environment):
-            utils.send_handshake(c, camera, environment.objects[tracked_object_id], environment)
-
-    environment.update_handshake_visual(window, c.id)
-    pygame.display.flip()
-    clock.tick(constants.FPS)
-    
-    progress = constants.AUTOPLAY
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            sys.exit()
-
-    while not progress:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                progress = True
-                break
-        clock.tick(20)
-    
+                quit_simulation(recorder)
+
+        while not progress:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    quit_simulation(recorder)
+                if event.type == pygame.KEYDOWN:
+                    progress = True
+                    break
+            clock.tick(20)
+
+if __name__ == "__main__":
+    main()
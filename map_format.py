@@ -0,0 +1,218 @@
+"""
+
+This file contains readers and writers for the two map file formats.
+
+The text format is described in environment_format.txt. read_text_map() streams through a text
+map instead of reading the whole file into memory, and parses the wall grid line by line with a
+single NumPy call.
+
+The binary format (files ending in BINARY_MAP_EXTENSION) stores the same information in typed
+sections that can be memory-mapped, so loading it is little more than opening the file:
+
+- header: the magic bytes b"CS4VMAP1" followed by six little-endian int64 values
+  (height, width, number of objects, number of path rows, number of visual values, number of cameras)
+- walls: one bit per tile (set for walls), each row of the grid padded to a whole number of bytes
+- objects: int64 (number of objects, 2) array of the shape of each object's visual
+- path lengths: int64 array of the number of path rows of each object
+- visuals: int32 array of every object's visual, flattened and concatenated
+- paths: int32 (number of path rows, 4) array of every object's path rows, concatenated
+- cameras: int32 (number of cameras, 2) array of camera positions
+
+Every section starts at a multiple of 8 bytes. Text maps can be converted to binary maps from the
+command line:
+
+    python map_format.py many_cameras.txt
+
+"""
+
+import argparse
+import itertools
+import numpy as np
+
+BINARY_MAP_EXTENSION = ".cmap"
+BINARY_MAP_MAGIC = b"CS4VMAP1"
+HEADER_FIELDS = 6
+
+
+"""
+    
+Inputs:
+- map_file_path -> path of a map in the text format
+
+Output:
+- A 3-tuple of (walls, objects, cameras), where walls is the 2D array of the map, objects is a list of
+(visual, path) tuples, and cameras is a list of (x,y) tuples
+
+"""
+def read_text_map(map_file_path):
+    with open(map_file_path, "r") as f:
+        height, width = (int(value) for value in next(f).split())
+        # The grid is parsed row by row straight from the file by a single call, so its text is never held in memory
+        walls = np.loadtxt(itertools.islice(f, height), dtype=np.float64, ndmin=2).reshape(height, width)
+
+        objects = list()
+        objects_length = int(next(f))
+        for _ in range(objects_length):
+            object_width, object_height = (int(value) for value in next(f).split())
+            visual = np.zeros((object_width, object_height))
+            for a in range(object_height):
+                visual[a] = np.array(next(f).split()).astype(int)
+            path_length = int(next(f))
+            path = [np.array(next(f).split()).astype(int) for _ in range(path_length)]
+            objects.append((visual, path))
+
+        cameras_length = int(next(f))
+        cameras = list()
+        for _ in range(cameras_length):
+            x, y = (int(value) for value in next(f).split())
+            cameras.append((x, y))
+    return walls, objects, cameras
+
+"""
+    
+Inputs:
+- map_file_path -> path to write the text map to
+- walls -> 2D array of the map
+- objects -> a list of (visual, path) tuples
+- cameras -> a list of (x,y) tuples
+
+Output:
+- N/A
+
+"""
+def write_text_map(map_file_path, walls, objects, cameras):
+    walls = np.asarray(walls)
+    with open(map_file_path, "w") as f:
+        f.write("%d %d\n" % walls.shape)
+        np.savetxt(f, walls, fmt="%d")
+        f.write("%d\n" % len(objects))
+        for visual, path in objects:
+            f.write("%d %d\n" % visual.shape)
+            np.savetxt(f, visual, fmt="%d")
+            f.write("%d\n" % len(path))
+            np.savetxt(f, np.asarray(path).reshape(-1, 4), fmt="%d")
+        f.write("%d\n" % len(cameras))
+        np.savetxt(f, np.asarray(cameras).reshape(-1, 2), fmt="%d")
+
+"""
+    
+Inputs:
+- counts -> the six values of the header of a binary map
+
+Output:
+- A dictionary mapping each section name to its (offset, dtype, shape)
+
+"""
+def get_binary_sections(counts):
+    height, width, num_objects, num_path_rows, num_visual_values, num_cameras = (int(count) for count in counts)
+    sections = dict()
+    offset = len(BINARY_MAP_MAGIC) + 8 * HEADER_FIELDS
+    for name, dtype, shape in (
+        ("walls", np.uint8, (height, (width + 7) // 8)),
+        ("objects", np.int64, (num_objects, 2)),
+        ("path_lengths", np.int64, (num_objects,)),
+        ("visuals", np.int32, (num_visual_values,)),
+        ("paths", np.int32, (num_path_rows, 4)),
+        ("cameras", np.int32, (num_cameras, 2)),
+    ):
+        sections[name] = offset, dtype, shape
+        offset += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8
+    return sections
+
+"""
+    
+Inputs:
+- map_file_path -> path of a map in the binary format
+
+Output:
+- The same 3-tuple as read_text_map(). Walls are 1 and every other tile is 0.
+
+Description:
+Every section of the file is memory-mapped, so only the parts that are actually used are read from disk.
+
+"""
+def read_binary_map(map_file_path):
+    with open(map_file_path, "rb") as f:
+        if f.read(len(BINARY_MAP_MAGIC)) != BINARY_MAP_MAGIC:
+            raise ValueError(map_file_path + " is not a binary map")
+        counts = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype="<i8")
+    height, width = int(counts[0]), int(counts[1])
+    sections = dict()
+    for name, (offset, dtype, shape) in get_binary_sections(counts).items():
+        if int(np.prod(shape)) == 0:
+            sections[name] = np.zeros(shape, dtype=dtype)
+        else:
+            sections[name] = np.memmap(map_file_path, dtype=np.dtype(dtype).newbyteorder("<"), mode="r", offset=offset, shape=shape)
+
+    walls = np.unpackbits(sections["walls"], axis=1, count=width)
+    objects = list()
+    visual_offset = 0
+    path_offset = 0
+    for (object_width, object_height), path_length in zip(sections["objects"], sections["path_lengths"]):
+        visual_size = int(object_width * object_height)
+        visual = sections["visuals"][visual_offset:visual_offset + visual_size].reshape(object_width, object_height).astype(np.float64)
+        path = list(np.array(sections["paths"][path_offset:path_offset + path_length], dtype=np.int64))
+        objects.append((visual, path))
+        visual_offset += visual_size
+        path_offset += int(path_length)
+    cameras = [(int(x), int(y)) for x, y in sections["cameras"]]
+    return walls, objects, cameras
+
+"""
+    
+Inputs:
+- map_file_path -> path to write the binary map to
+- walls -> 2D array of the map, where tiles greater than 0 are walls
+- objects -> a list of (visual, path) tuples
+- cameras -> a list of (x,y) tuples
+
+Output:
+- N/A
+
+"""
+def write_binary_map(map_file_path, walls, objects, cameras):
+    walls = np.asarray(walls)
+    height, width = walls.shape
+    visuals = [np.asarray(visual) for visual, _ in objects]
+    paths = [np.asarray(path, dtype=np.int64).reshape(-1, 4) for _, path in objects]
+    counts = (height, width, len(objects), sum(len(path) for path in paths), sum(visual.size for visual in visuals), len(cameras))
+    data = {
+        "walls": np.packbits(walls > 0, axis=1),
+        "objects": np.array([visual.shape for visual in visuals], dtype=np.int64).reshape(-1, 2),
+        "path_lengths": np.array([len(path) for path in paths], dtype=np.int64),
+        "visuals": np.concatenate([visual.ravel() for visual in visuals] + [np.zeros(0)]).astype(np.int32),
+        "paths": np.concatenate(paths + [np.zeros((0, 4), dtype=np.int64)]).astype(np.int32),
+        "cameras": np.array(cameras, dtype=np.int32).reshape(-1, 2),
+    }
+    with open(map_file_path, "wb") as f:
+        f.write(BINARY_MAP_MAGIC)
+        f.write(np.array(counts, dtype="<i8").tobytes())
+        for name, (offset, dtype, shape) in get_binary_sections(counts).items():
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(np.ascontiguousarray(data[name], dtype=np.dtype(dtype).newbyteorder("<")).tobytes())
+        f.write(b"\0" * (-f.tell() % 8))
+
+"""
+    
+Inputs:
+- text_file_path -> path of a map in the text format
+- binary_file_path -> path to write the binary map to
+
+Output:
+- N/A
+
+"""
+def convert_text_map(text_file_path, binary_file_path):
+    write_binary_map(binary_file_path, *read_text_map(text_file_path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert text maps to binary maps.")
+    parser.add_argument("map_names", nargs="+", help="names of text maps within the maps folder")
+    args = parser.parse_args()
+    for map_name in args.map_names:
+        binary_name = map_name.rsplit(".", 1)[0] + BINARY_MAP_EXTENSION
+        convert_text_map("maps/" + map_name, "maps/" + binary_name)
+        print("maps/" + map_name, "->", "maps/" + binary_name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+
+A multi-target tracker runs the handshake tracking algorithm described in main.py for many objects
+at once. Every target is followed exactly as a Simulator (see simulator.py) would follow it on its
+own, but the work shared between targets is only done once per frame:
+
+- whether a camera can see an object, and which cameras can see an object, are computed once per
+  (camera, object) and object, no matter how many targets involve them
+- a handshake depends only on the sending camera and the object, so it is built once and handed to
+  every camera and target that receives it
+- the best match of a handshake by a receiving camera is computed once and reused by every target
+  whose handshake came from the same camera and object
+
+Each camera holds its handshakes in camera.handshakes, keyed by the id of the target they belong to.
+
+The tracker can also be ran from the command line over any map in the maps folder:
+
+    python multi_tracker.py many_objects.txt --frames 1000 --targets 0 1 2
+
+"""
+
+import argparse
+import constants
+import csv
+import profiler
+import time
+import utils
+from collections import namedtuple
+from environment import Environment
+from simulator import FrameResult, summarize
+
+# The outcome of a single frame of a single target. correct is True if the tracked object is the
+# object that the target started out as.
+TargetResult = namedtuple("TargetResult", ["frame", "target_id", "tracking_camera_id", "tracked_object_id", "correct"])
+
+class MultiTracker:
+
+    """
+
+    Inputs:
+    - environment -> an environment whose vision ranges have been initialized
+    - target_ids -> the ids of the objects to track. If None, every object that a camera can see is tracked.
+    - weights -> a 3-tuple of the position, appearance, and size weights used for handshake matching.
+    If None, POS_CONST, APPEARANCE_CONST, and SIZE_CONST are used.
+
+    Description:
+    The camera that initially tracks each target is the first camera that can see it (step 2 of the
+    algorithm in main.py).
+
+    """
+    def __init__(self, environment, target_ids = None, weights = None):
+        self.environment = environment
+        self.weights = weights
+        self.frame = 0
+        # Maps each target id to its tracking camera and the id of the object it is currently tracking
+        self.tracking_cameras = dict()
+        self.tracked_object_ids = dict()
+        # Maps each target id to the (receiving camera, sending camera id, object id) of each of its handshakes
+        self.handshake_receivers = dict()
+        self.reset_frame_cache()
+
+        for target_id in range(len(environment.objects)) if target_ids is None else target_ids:
+            cameras = self.get_cameras_seeing_object(environment.objects[target_id])
+            if len(cameras) == 0:
+                if target_ids is None:
+                    continue
+                raise ValueError("No camera can see object " + str(target_id))
+            self.tracking_cameras[target_id] = cameras[0]
+            self.tracked_object_ids[target_id] = target_id
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - N/A
+
+    Description:
+    This function discards everything remembered about the current positions of the objects. It is called
+    whenever the objects move.
+
+    """
+    def reset_frame_cache(self):
+        self.visible_cameras = dict()
+        self.visibility = dict()
+
+    """
+
+    Inputs:
+    - camera -> a camera
+    - object -> an object
+
+    Output:
+    - Boolean value indicating whether camera can see any part of the object, computed at most once per frame
+
+    """
+    def can_camera_see_object(self, camera, object):
+        key = camera.id, object.id
+        if key not in self.visibility:
+            self.visibility[key] = utils.can_camera_see_object(camera, object, self.environment)
+        return self.visibility[key]
+
+    """
+
+    Inputs:
+    - object -> an object
+
+    Output:
+    - A list of every camera that can see any part of the object in increasing order of id, computed at most once
+    per frame
+
+    """
+    def get_cameras_seeing_object(self, object):
+        if object.id not in self.visible_cameras:
+            self.visible_cameras[object.id] = [
+                camera for camera in utils.get_cameras_seeing_object(object, self.environment)
+                if self.can_camera_see_object(camera, object)
+            ]
+        return self.visible_cameras[object.id]
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - A list of the TargetResult of every target for the frame
+
+    Description:
+    This function runs step 3 of the algorithm in main.py for a single frame, for every target.
+
+    """
+    def step(self):
+        environment = self.environment
+        objects = environment.objects
+
+        # a) Every target whose tracking camera cannot see its tracked object is handed off to the first camera
+        # (in increasing order of id) whose handshake for the target matches an object
+        matches = dict()
+        for target_id, camera in self.tracking_cameras.items():
+            tracked_object = objects[self.tracked_object_ids[target_id]]
+            if self.can_camera_see_object(camera, tracked_object):
+                continue
+            receivers = self.handshake_receivers.get(target_id, ())
+            if constants.HANDOFF_GRAPH:
+                # Cameras that the object is moving towards are checked first
+                receivers = environment.get_camera_graph().order_handoff_candidates(camera, tracked_object, receivers, key = lambda receiver: receiver[0])
+            for receiver, sender_id, object_id in receivers:
+                key = receiver.id, sender_id, object_id
+                if key not in matches:
+                    target_pos, target_appearance = receiver.handshakes[target_id]
+                    candidates = utils.get_candidate_objects(receiver, target_pos, environment)
+                    matches[key] = utils.get_best_object_match(receiver, candidates, target_pos, target_appearance, environment, verbose = False, weights = self.weights)
+                if matches[key] is not None:
+                    self.tracking_cameras[target_id] = receiver
+                    self.tracked_object_ids[target_id] = matches[key].id
+                    break
+
+        # b) Record each tracked object's location and visual representation
+        for receivers in self.handshake_receivers.values():
+            for receiver, _, _ in receivers:
+                receiver.handshakes.clear()
+        self.handshake_receivers = dict()
+        environment.step()
+        self.reset_frame_cache()
+
+        # c) Send a handshake for each target to every other camera that can see its tracked object
+        handshakes = dict()
+        for target_id, camera in self.tracking_cameras.items():
+            tracked_object = objects[self.tracked_object_ids[target_id]]
+            receivers = list()
+            for receiver in self.get_cameras_seeing_object(tracked_object):
+                if receiver.id == camera.id:
+                    continue
+                key = camera.id, tracked_object.id
+                if key not in handshakes:
+                    handshakes[key] = utils.guess_new_position(tracked_object), utils.get_object_appearance(camera, tracked_object, environment)
+                receiver.handshakes[target_id] = handshakes[key]
+                receivers.append((receiver, camera.id, tracked_object.id))
+            self.handshake_receivers[target_id] = receivers
+
+        environment.focus_vision(
+            [objects[object_id].pos for object_id in self.tracked_object_ids.values()],
+            sorted(set(camera.id for camera in self.tracking_cameras.values()))
+        )
+        results = [
+            TargetResult(self.frame, target_id, camera.id, self.tracked_object_ids[target_id], self.tracked_object_ids[target_id] == target_id)
+            for target_id, camera in self.tracking_cameras.items()
+        ]
+        self.frame += 1
+        return results
+
+    """
+
+    Inputs:
+    - frames -> the number of frames to simulate
+
+    Output:
+    - A list of the TargetResult of every target in every simulated frame
+
+    """
+    def run(self, frames):
+        results = list()
+        for _ in range(frames):
+            results.extend(self.step())
+        return results
+
+"""
+
+Inputs:
+- results -> a list of TargetResult
+
+Output:
+- A dictionary mapping each target id to the (accuracy, hand-offs) of that target (see summarize() in simulator.py)
+
+"""
+def summarize_targets(results):
+    target_results = dict()
+    for result in results:
+        target_results.setdefault(result.target_id, list()).append(
+            FrameResult(result.frame, result.tracking_camera_id, result.tracked_object_id, result.correct)
+        )
+    return {target_id: summarize(frames) for target_id, frames in target_results.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Track many objects at once without visuals.")
+    parser.add_argument("map_name", help="name of a file within the maps folder")
+    parser.add_argument("--frames", type=int, default=1000, help="number of frames to simulate")
+    parser.add_argument("--targets", type=int, nargs="*", help="ids of the objects to track (every visible object by default)")
+    parser.add_argument("--output", help="if given, write the result of every target in every frame to this CSV file")
+    parser.add_argument("--profile", help="if given, time every stage of every frame, print a summary, and write the time of every frame to this CSV (or .json) file")
+    args = parser.parse_args()
+
+    environment = Environment(args.map_name)
+    utils.initialize_vision_ranges(environment)
+    tracker = MultiTracker(environment, args.targets)
+    if args.profile is not None:
+        profiler.enable([MultiTracker])
+    start = time.perf_counter()
+    results = tracker.run(args.frames)
+    elapsed = time.perf_counter() - start
+
+    summaries = summarize_targets(results)
+    for target_id, (accuracy, hand_offs) in sorted(summaries.items()):
+        print("Target", target_id, "Accuracy =", accuracy, "Hand-offs =", hand_offs)
+    print("Targets =", len(summaries), "Frames =", args.frames, "Frames per second =", round(args.frames / max(elapsed, 1e-9), 1))
+    if len(summaries) > 0:
+        print("Mean accuracy =", sum(accuracy for accuracy, _ in summaries.values()) / len(summaries))
+    if args.output is not None:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(TargetResult._fields)
+            writer.writerows(results)
+    if args.profile is not None:
+        profiler.disable()
+        profiler.print_summary()
+        profiler.write_frames(args.profile)
+
+if __name__ == "__main__":
+    main()
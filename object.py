@@ -5,27 +5,103 @@ environment. It consists of the full 2d representation of the object's appearanc
 and a list of positions, orientations, and times between new positions, which the object passes
 through over the course of a simulation.
 
-
+The object's position, orientation, and progress on its path are kept in an object store (see
+object_store.py) shared with the environment's other objects, so that they can all be moved at once.
 
 """
 
 import constants
 import numpy as np
-import pygame
+from object_store import ObjectStore
 
 class Object:
 
-    def __init__(self, id, visual, path):
-        self.id = id        
+    __slots__ = ("id", "store", "index", "size", "width", "height", "visual", "rotation", "rotations", "sprites", "sprite_scale")
+
+    """
+    
+    Inputs:
+    - id -> the object's id
+    - visual -> 2D array of the object's appearance
+    - path -> list of (x, y, speed, orientation) rows the object passes through
+    - store -> if not None, the object store holding this object's movement state, whose row index must have been
+    created from path. Otherwise the object gets a store of its own.
+    - index -> the row of store holding this object's movement state
+
+    Description:
+    An object is a lightweight view of a row of an object store (see object_store.py). Its position, orientation,
+    and progress on its path are read from and written to the store.
+
+    """
+    def __init__(self, id, visual, path, store = None, index = 0):
+        if store is None:
+            store = ObjectStore([path])
+            index = 0
+        self.id = id
+        self.store = store
+        self.index = index
         self.rotation = 0
         self.size = self.width, self.height = visual.shape
         self.visual = visual
-        self.path = path 
-        self.pos = self.x, self.y = float(self.path[0][0]), float(self.path[0][1]) 
-        self.time_until_change = self.path[0][2]
-        self.orientation = self.path[0][3]
-        self.path_progress = 0
-        self.prev_pos = None
+        # Rotated visuals and their pre-rendered sprites, keyed by degrees (see rotate() and get_sprite())
+        self.rotations = dict()
+        self.sprites = dict()
+        self.sprite_scale = None
+
+    @property
+    def path(self):
+        start = self.store.path_offsets[self.index]
+        return self.store.paths[start:start + self.store.path_lengths[self.index]]
+
+    @property
+    def x(self):
+        return float(self.store.positions[self.index, 0])
+
+    @x.setter
+    def x(self, value):
+        self.store.positions[self.index, 0] = value
+
+    @property
+    def y(self):
+        return float(self.store.positions[self.index, 1])
+
+    @y.setter
+    def y(self, value):
+        self.store.positions[self.index, 1] = value
+
+    @property
+    def pos(self):
+        return tuple(self.store.positions[self.index].tolist())
+
+    @pos.setter
+    def pos(self, value):
+        self.store.positions[self.index] = value
+
+    @property
+    def prev_pos(self):
+        if not self.store.has_previous_positions[self.index]:
+            return None
+        return tuple(self.store.previous_positions[self.index].tolist())
+
+    @property
+    def orientation(self):
+        return int(self.store.orientations[self.index])
+
+    @orientation.setter
+    def orientation(self, value):
+        self.store.orientations[self.index] = value
+
+    @property
+    def time_until_change(self):
+        return int(self.store.time_until_change[self.index])
+
+    @property
+    def path_progress(self):
+        return int(self.store.path_progress[self.index])
+
+    @property
+    def version(self):
+        return int(self.store.versions[self.index])
 
 
     """
@@ -36,18 +112,62 @@ class Object:
     Output:
     - A 2D array describing the object's appearance after being rotated the specified number of degrees
 
+    Description:
+    Each rotation is computed once and cached, so the returned array is read-only and shared with every
+    other caller.
+
     """
     def rotate(self, degrees): 
+        if degrees in self.rotations:
+            return self.rotations[degrees]
         if degrees == 0:
-            return self.visual
+            rotated = self.visual.view()
         elif degrees == 90:
-            return np.rot90(self.visual, 1)   
+            rotated = np.rot90(self.visual, 1)   
         elif degrees == 180:
-            return np.rot90(self.visual, 2)   
+            rotated = np.rot90(self.visual, 2)   
         elif degrees == 270:
-            return np.rot90(self.visual, 3)   
+            rotated = np.rot90(self.visual, 3)   
         else:
             return None
+        rotated = np.ascontiguousarray(rotated)
+        rotated.flags.writeable = False
+        self.rotations[degrees] = rotated
+        return rotated
+
+    """
+    
+    Inputs:
+    - degrees -> number of degrees to rotate the object relative to its original position (must be 0, 90, 180, or 270)
+
+    Output:
+    - A Pygame surface of the object's appearance after being rotated the specified number of degrees, scaled by SCALE,
+    where pixels with a value of 0 are transparent
+
+    Description:
+    Sprites are rendered once per orientation with pygame.surfarray and cached until SCALE changes.
+
+    """
+    def get_sprite(self, degrees):
+        # Pygame is only imported when drawing so that headless simulations never load it
+        import pygame
+        if self.sprite_scale != constants.SCALE:
+            self.sprites.clear()
+            self.sprite_scale = constants.SCALE
+        if degrees not in self.sprites:
+            rotated = self.rotate(degrees)
+            # Magenta is never a shade of grey, so it is used as the transparent color
+            transparent = (255, 0, 255)
+            shade = np.clip(20 * rotated, 0, 255).astype(np.uint8)
+            pixels = np.repeat(shade[:, :, None], 3, axis=2)
+            pixels[rotated <= 0] = transparent
+            pixels = np.repeat(np.repeat(pixels, constants.SCALE, axis=0), constants.SCALE, axis=1)
+            sprite = pygame.surfarray.make_surface(pixels)
+            if pygame.display.get_surface() is not None:
+                sprite = sprite.convert()
+            sprite.set_colorkey(transparent)
+            self.sprites[degrees] = sprite
+        return self.sprites[degrees]
 
 
     """
@@ -64,23 +184,23 @@ class Object:
 
     """
     def progress_on_path(self):
-        if self.path_progress == len(self.path) - 1:
-            return
-        if self.path_progress < len(self.path) - 1:
-            if self.time_until_change == 0:
-                self.path_progress += 1
-                self.time_until_change = self.path[self.path_progress][2]
-            if self.path_progress == len(self.path) - 1:
-                return
-            prev_x, prev_y, speed, orientation = self.path[self.path_progress]
-            dest_x, dest_y, _, _ = self.path[self.path_progress + 1]
-            dx = (dest_x - prev_x) / speed
-            dy = (dest_y - prev_y) / speed
-            self.x += dx
-            self.y += dy
-            self.pos = (self.x, self.y)
-            self.time_until_change -= 1
-            self.orientation = orientation
+        self.store.progress_on_path([self.index])
+
+    """
+    
+    Inputs:
+    - N/A
+
+    Output:
+    - N/A
+
+    Description:
+    This function remembers the object's current position as its previous position, then updates the
+    object's position and orientation according to its current progress on its pre-defined path.
+
+    """
+    def step(self):
+        self.store.step([self.index])
 
     """
     
@@ -93,26 +213,18 @@ class Object:
     - N/A
 
     Description:
-    This function updates the object's position and orientation according to its current
-    progress on its pre-defined path, then updates screen with the object's new state. An
-    object gets a blue outline if it is being correctly tracked by the camera. An object
-    gets a purple outline if it is being incorrectly tracked by the camera.
+    This function updates screen with the object's current state. An object gets a blue outline if it
+    is being correctly tracked by the camera. An object gets a purple outline if it is being incorrectly
+    tracked by the camera. The object itself is drawn with a single blit of its cached sprite.
 
     """
-    def update(self, screen, is_tracked, is_false_tracked):
-        self.prev_pos = self.pos
-        self.progress_on_path()
+    def draw(self, screen, is_tracked, is_false_tracked):
+        # Pygame is only imported when drawing so that headless simulations never load it
+        import pygame
         x_offset = int(self.x * constants.SCALE)
         y_offset = int(self.y * constants.SCALE)
         temp_visual = self.rotate(self.orientation)
-        for y in range(temp_visual.shape[1]):
-            for x in range(temp_visual.shape[0]):
-                if temp_visual[x,y] > 0:
-                    pygame.draw.rect(
-                        screen,
-                        (20 * temp_visual[x,y], 20 * temp_visual[x,y], 20 * temp_visual[x,y]),
-                        (int(x_offset + x * constants.SCALE), int(y_offset + y * constants.SCALE), constants.SCALE, constants.SCALE)
-                    )
+        screen.blit(self.get_sprite(self.orientation), (x_offset, y_offset))
         if is_tracked:
             pygame.draw.rect(
                 screen,
@@ -127,6 +239,23 @@ class Object:
                 (x_offset, y_offset, constants.SCALE * temp_visual.shape[0], constants.SCALE * temp_visual.shape[1]),
                 2
             )
-        
 
+    """
+    
+    Inputs:
+    - screen -> The Pygame window used for display
+    - is_tracked -> True if the object is being correctly tracked by the camera
+    - is_false_tracked -> True if the object is being incorrectly tracked by the camera
+
+    Output:
+    - N/A
+
+    Description:
+    This function updates the object's position and orientation according to its current
+    progress on its pre-defined path with step(), then updates screen with the object's new
+    state with draw().
 
+    """
+    def update(self, screen, is_tracked, is_false_tracked):
+        self.step()
+        self.draw(screen, is_tracked, is_false_tracked)
@@ -0,0 +1,143 @@
+"""
+
+An object grid is a spatial index over the positions of an environment's objects. The map is
+divided into square cells of OBJECT_GRID_CELL_SIZE tiles, and every object is stored in the cell
+containing its position, so finding the objects near a position only requires looking at the few
+cells around it, no matter how many objects the environment contains.
+
+The cell of every object is kept in an array, and moving objects only updates the rows of the objects
+that changed cells, all at once with NumPy. The objects sorted by cell are rebuilt the next time the
+grid is queried, with one sort, so that even frames in which most objects change cells do not run any
+Python code per object.
+
+"""
+
+import math
+import numpy as np
+
+class ObjectGrid:
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # Row i holds the (x,y) cell of the object whose id is i, if in_grid[i] is True
+        self.object_cells = np.zeros((0, 2), dtype=np.int64)
+        self.in_grid = np.zeros(0, dtype=bool)
+        self.objects = dict()
+        # The ids of the objects in the grid sorted by cell, and the key of each one's cell (see get_cell_keys()).
+        # They are None until the grid is queried after an object was inserted or changed cells.
+        self.sorted_ids = None
+        self.sorted_keys = None
+
+    """
+    
+    Inputs:
+    - pos -> a 2-tuple of (x,y)
+
+    Output:
+    - A 2-tuple describing the cell containing pos
+
+    """
+    def get_cell(self, pos):
+        return int(math.floor(pos[0] / self.cell_size)), int(math.floor(pos[1] / self.cell_size))
+
+    """
+    
+    Inputs:
+    - cells -> (n,2) array of (x,y) cells
+
+    Output:
+    - int64 array of a key for each cell. Sorting by key sorts cells by x and then by y, so the cells of a column
+    between two rows have consecutive keys.
+
+    """
+    def get_cell_keys(self, cells):
+        cells = np.asarray(cells, dtype=np.int64)
+        return (cells[..., 0] << 32) + (cells[..., 1] + (1 << 31))
+
+    """
+    
+    Inputs:
+    - object -> an object that is not in the grid yet
+
+    Output:
+    - N/A
+
+    """
+    def insert(self, object):
+        if object.id >= len(self.in_grid):
+            # The arrays grow by doubling so that inserting many objects one by one stays linear
+            size = max(2 * len(self.in_grid), object.id + 1)
+            object_cells = np.zeros((size, 2), dtype=np.int64)
+            object_cells[:len(self.object_cells)] = self.object_cells
+            in_grid = np.zeros(size, dtype=bool)
+            in_grid[:len(self.in_grid)] = self.in_grid
+            self.object_cells, self.in_grid = object_cells, in_grid
+        self.object_cells[object.id] = self.get_cell(object.pos)
+        self.in_grid[object.id] = True
+        self.objects[object.id] = object
+        self.sorted_ids = None
+
+    """
+    
+    Inputs:
+    - object -> an object in the grid whose position may have changed
+
+    Output:
+    - N/A
+
+    """
+    def move(self, object):
+        self.move_all([object.id], [object.pos])
+
+    """
+    
+    Inputs:
+    - object_ids -> array of the ids of objects in the grid whose positions may have changed
+    - positions -> (n,2) array of the current (x,y) position of each of those objects
+
+    Output:
+    - N/A
+
+    Description:
+    This function moves every object to the cell containing its current position. Nothing happens if no object
+    changed cells.
+
+    """
+    def move_all(self, object_ids, positions):
+        object_ids = np.asarray(object_ids, dtype=np.intp)
+        cells = np.floor(np.asarray(positions, dtype=np.float64).reshape(-1, 2) / self.cell_size).astype(np.int64)
+        changed = np.any(cells != self.object_cells[object_ids], axis=1)
+        if np.any(changed):
+            self.object_cells[object_ids[changed]] = cells[changed]
+            self.sorted_ids = None
+
+    """
+    
+    Inputs:
+    - pos -> a 2-tuple of (x,y)
+    - radius -> the largest distance from pos to return objects for
+
+    Output:
+    - A list of the objects whose distance to pos is at most radius, sorted by id. Distances are measured like the
+    position difference of get_object_match() in utils.py (the sum of the x and y differences).
+
+    """
+    def query(self, pos, radius):
+        if self.sorted_ids is None:
+            object_ids = np.flatnonzero(self.in_grid)
+            keys = self.get_cell_keys(self.object_cells[object_ids])
+            order = np.argsort(keys, kind="stable")
+            self.sorted_ids, self.sorted_keys = object_ids[order], keys[order]
+        min_x, min_y = self.get_cell((pos[0] - radius, pos[1] - radius))
+        max_x, max_y = self.get_cell((pos[0] + radius, pos[1] + radius))
+        columns = np.arange(min_x, max_x + 1)
+        starts = np.searchsorted(self.sorted_keys, self.get_cell_keys(np.stack((columns, np.full_like(columns, min_y)), axis=1)), side="left")
+        ends = np.searchsorted(self.sorted_keys, self.get_cell_keys(np.stack((columns, np.full_like(columns, max_y)), axis=1)), side="right")
+        nearby = list()
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            for object_id in self.sorted_ids[start:end].tolist():
+                object = self.objects[object_id]
+                if abs(object.pos[0] - pos[0]) + abs(object.pos[1] - pos[1]) <= radius:
+                    nearby.append(object)
+        nearby.sort(key=lambda object: object.id)
+        return nearby
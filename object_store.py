@@ -0,0 +1,107 @@
+"""
+
+An object store holds the movement state of many objects in contiguous NumPy arrays (one row per
+object), so that every object can be moved along its path in a single vectorized step. The paths of
+all objects are flattened into one array, and path_offsets[i] is the row of the first point of
+object i's path.
+
+Object instances (see object.py) do not keep any movement state themselves. They are views of one
+row of a store.
+
+"""
+
+import numpy as np
+
+class ObjectStore:
+
+    """
+
+    Inputs:
+    - paths -> a list of every object's path, where each path is a list of (x, y, speed, orientation) rows
+
+    """
+    def __init__(self, paths):
+        paths = [np.asarray(path, dtype=np.int64).reshape(-1, 4) for path in paths]
+        self.path_lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        self.last_points = self.path_lengths - 1
+        self.path_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum(self.path_lengths, out=self.path_offsets[1:])
+        self.paths = np.concatenate(paths + [np.zeros((0, 4), dtype=np.int64)])
+        # Distance moved in a single frame while travelling from each point of a path to the next. The value for the
+        # last point of a path is never used.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.path_steps = (np.roll(self.paths[:, :2], -1, axis=0) - self.paths[:, :2]) / self.paths[:, 2:3]
+        # Row of self.paths holding the point each object is currently travelling from
+        self.path_rows = self.path_offsets[:-1].copy()
+        first_rows = self.paths[self.path_rows]
+        self.positions = first_rows[:, :2].astype(np.float64)
+        # has_previous_positions is False until an object is stepped for the first time
+        self.previous_positions = np.zeros_like(self.positions)
+        self.has_previous_positions = np.zeros(len(paths), dtype=bool)
+        self.path_progress = np.zeros(len(paths), dtype=np.int64)
+        self.time_until_change = first_rows[:, 2].copy()
+        self.orientations = first_rows[:, 3].copy()
+        # Incremented every time an object moves, so that cached appearances of the object can be invalidated
+        self.versions = np.zeros(len(paths), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.path_lengths)
+
+    """
+
+    Inputs:
+    - indices -> if not None, an array of the indices of the objects to progress. Otherwise every object is progressed.
+
+    Output:
+    - An array of the indices of the objects that moved
+
+    Description:
+    This function updates the position and orientation of objects according to their current progress on their
+    pre-defined paths. An object whose time until change has run out moves on to the next point of its path, and every
+    object that has not reached the last point of its path moves 1/speed of the way towards the next point.
+
+    """
+    def progress_on_path(self, indices = None):
+        unfinished = self.path_progress < self.last_points
+        if indices is not None:
+            selected = np.zeros(len(self), dtype=bool)
+            selected[indices] = True
+            unfinished &= selected
+
+        changing = np.flatnonzero(unfinished & (self.time_until_change == 0))
+        if len(changing) > 0:
+            self.path_progress[changing] += 1
+            self.path_rows[changing] += 1
+            self.time_until_change[changing] = self.paths[self.path_rows[changing], 2]
+            # Objects that have just reached the last point of their path stop without moving
+            unfinished[changing] = self.path_progress[changing] < self.last_points[changing]
+
+        moving = np.flatnonzero(unfinished)
+        rows = self.path_rows[moving]
+        self.positions[moving] += self.path_steps[rows]
+        self.time_until_change[moving] -= 1
+        self.orientations[moving] = self.paths[rows, 3]
+        self.versions[moving] += 1
+        return moving
+
+    """
+
+    Inputs:
+    - indices -> if not None, an array of the indices of the objects to step. Otherwise every object is stepped.
+
+    Output:
+    - An array of the indices of the objects that moved
+
+    Description:
+    This function remembers the current positions of objects as their previous positions, then progresses them on
+    their paths with progress_on_path().
+
+    """
+    def step(self, indices = None):
+        if indices is None:
+            self.previous_positions[:] = self.positions
+            self.has_previous_positions[:] = True
+        else:
+            self.previous_positions[indices] = self.positions[indices]
+            self.has_previous_positions[indices] = True
+        return self.progress_on_path(indices)
@@ -0,0 +1,172 @@
+"""
+
+Packed vision ranges hold the vision range of every camera of an environment in two bits per tile
+instead of one byte. A vision range only holds the values 0 (not reached), 1 (visible), and 2
+(reached but not visible), so it is split into two bit-packed arrays of shape
+(ceil(number of cameras / 8), height, width):
+
+- visible: bit i of the bytes at [:, y, x] is set if camera i can see tile (x,y)
+- blocked: bit i of the bytes at [:, y, x] is set if camera i reached tile (x,y) without seeing it
+
+Like np.packbits, the first camera of each byte is stored in its most significant bit. The visible
+array doubles as the reverse index answering which cameras can see a tile (see camera_visibility in
+environment.py). At 1000 cameras on a 1000x1000 map both arrays together take 250 MB.
+
+"""
+
+import numpy as np
+
+class PackedVisionRanges:
+
+    """
+
+    Inputs:
+    - num_cameras -> the number of cameras
+    - size -> the (height, width) of the map
+    - visible, blocked -> if not None, existing (possibly memory-mapped) arrays to use instead of empty ones
+
+    """
+    def __init__(self, num_cameras, size, visible = None, blocked = None):
+        shape = ((num_cameras + 7) // 8,) + tuple(size)
+        self.num_cameras = num_cameras
+        self.size = tuple(size)
+        self.visible = np.zeros(shape, dtype=np.uint8) if visible is None else visible
+        self.blocked = np.zeros(shape, dtype=np.uint8) if blocked is None else blocked
+
+    def __len__(self):
+        return self.num_cameras
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - A 2-tuple of (byte, bit), the index of the camera's byte along the first axis and the uint8 mask of its bit
+
+    """
+    def get_bit(self, camera_id):
+        return camera_id // 8, np.uint8(1 << (7 - camera_id % 8))
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - A read-only uint8 array of shape (height, width) holding the camera's vision range
+
+    Description:
+    The vision range is unpacked into a new array every time, so callers that read it often should keep it.
+
+    """
+    def get(self, camera_id):
+        byte, bit = self.get_bit(camera_id)
+        vision_range = ((self.visible[byte] & bit) != 0).view(np.uint8)
+        vision_range[(self.blocked[byte] & bit) != 0] = 2
+        vision_range.flags.writeable = False
+        return vision_range
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - x0, y0 -> the top left corner of a rectangle of tiles (inclusive)
+    - x1, y1 -> the bottom right corner of the rectangle (exclusive)
+
+    Output:
+    - Boolean array of shape (y1 - y0, x1 - x0), clipped to the map, of the tiles of the rectangle the camera can see
+
+    Description:
+    Only the rectangle is unpacked, so this is much faster than get() for small rectangles.
+
+    """
+    def get_visible(self, camera_id, x0, y0, x1, y1):
+        byte, bit = self.get_bit(camera_id)
+        return (self.visible[byte, y0:y1, x0:x1] & bit) != 0
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - vision_range -> the camera's new vision range
+
+    Output:
+    - N/A
+
+    """
+    def set(self, camera_id, vision_range):
+        byte, bit = self.get_bit(camera_id)
+        for packed, value in ((self.visible, 1), (self.blocked, 2)):
+            plane = packed[byte]
+            plane &= ~bit
+            plane |= np.where(vision_range == value, bit, np.uint8(0))
+
+    """
+
+    Inputs:
+    - start -> the id of the first camera of a group, which must be a multiple of 8
+    - packed -> packed vision ranges of consecutive cameras starting with camera start
+
+    Output:
+    - N/A
+
+    """
+    def set_group(self, start, packed):
+        end = start // 8 + len(packed.visible)
+        self.visible[start // 8:end] = packed.visible
+        self.blocked[start // 8:end] = packed.blocked
+
+    """
+
+    Inputs:
+    - camera_ids -> the ids of the cameras to find the boxes of, or None for every camera
+
+    Output:
+    - Array of shape (len(camera_ids), 4) of the bounding box (x0, y0, x1, y1) of the tiles each camera reached, with
+    exclusive ends. The box is empty (all zeros) if the camera did not reach any tile.
+
+    Description:
+    The rows and columns holding any tile reached by the cameras of a byte are found for all of them at once, so
+    the vision ranges are never unpacked.
+
+    """
+    def get_reach_boxes(self, camera_ids = None):
+        camera_ids = np.arange(self.num_cameras) if camera_ids is None else np.asarray(camera_ids, dtype=np.intp)
+        boxes = np.zeros((len(camera_ids), 4), dtype=np.int64)
+        for byte in np.unique(camera_ids // 8).tolist():
+            reached = self.visible[byte] | self.blocked[byte]
+            rows = np.bitwise_or.reduce(reached, axis=1)
+            columns = np.bitwise_or.reduce(reached, axis=0)
+            for i in np.flatnonzero(camera_ids // 8 == byte).tolist():
+                bit = self.get_bit(int(camera_ids[i]))[1]
+                ys = np.flatnonzero(rows & bit)
+                xs = np.flatnonzero(columns & bit)
+                if len(ys) > 0:
+                    boxes[i] = xs[0], ys[0], xs[-1] + 1, ys[-1] + 1
+        return boxes
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - Boolean value indicating whether the packed vision ranges can be changed (they are read-only when loaded from
+    the vision cache)
+
+    """
+    def is_writeable(self):
+        return self.visible.flags.writeable and self.blocked.flags.writeable
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - A writeable copy of the packed vision ranges held in memory
+
+    """
+    def copy(self):
+        return PackedVisionRanges(self.num_cameras, self.size, np.array(self.visible), np.array(self.blocked))
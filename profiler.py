@@ -0,0 +1,273 @@
+"""
+
+This file measures where the time of each frame goes. When profiling is enabled, the functions of
+every stage of the simulation listed in STAGES are wrapped with timers that count calls, accumulate
+time, and count the work items of each call (such as the number of line of sight traces). When it
+is disabled, the original functions are restored, so profiling costs nothing at all.
+
+The step() method of the classes passed to enable() (usually Simulator or MultiTracker) is timed as
+the "step" stage, and a new frame starts every time it is called, so work done between two steps,
+such as drawing, is counted towards the frame that was just simulated. Times are inclusive: a match
+includes the appearances it computes, and a step includes everything it calls. Only the outermost call
+of a stage is counted, so the draws made by draw_incremental() are not counted as rendering twice. The
+share column of the summary is relative to the time spent in steps.
+
+The "fanout" stage times finding the cameras that can see an object, mostly the lookup of the cameras
+that receive a handshake in step 3c of the algorithm in main.py.
+
+Example:
+
+    import profiler
+    profiler.enable([Simulator])
+    simulator.run(1000)
+    profiler.print_summary()
+    profiler.write_frames("frames.csv")
+
+simulator.py and multi_tracker.py take a --profile argument that does the same, and main.py
+profiles the visual simulation when PROFILE is True in constants.py.
+
+"""
+
+import csv
+import environment
+import json
+import numpy as np
+import time
+import utils
+
+# (owner, function name, stage, function returning the number of work items of a call or None)
+STAGES = [
+    (utils, "get_vision_range", "vision", None),
+    (utils, "is_pos_visible_from_pos", "visibility", None),
+    (utils, "are_positions_visible", "visibility", lambda starts, ends, environment: max(np.size(starts), np.size(ends)) // 2),
+    (utils, "get_object_appearance", "appearance", None),
+    (utils, "get_candidate_objects", "candidates", None),
+    (utils, "get_best_object_match", "matching", lambda camera, objects, *args, **kwargs: len(objects)),
+    (utils, "get_object_match", "matching", None),
+    (utils, "send_handshake", "handshakes", None),
+    (utils, "get_cameras_seeing_object", "fanout", None),
+    (utils, "can_camera_see_object", "fanout", None),
+    (environment.Environment, "step", "movement", None),
+    (environment.Environment, "draw", "rendering", None),
+    (environment.Environment, "draw_incremental", "rendering", None),
+    (environment.Environment, "update_handshake_visual", "rendering", None),
+    (environment.Environment, "redraw_handshake_visual", "rendering", None),
+]
+
+# The original functions replaced while profiling is enabled, keyed by (owner, function name)
+_originals = dict()
+# Maps each stage to its [calls, seconds, items] over the whole run and over the current frame
+_totals = dict()
+_frame_totals = dict()
+_frames = list()
+# Maps each stage to whether a call of the stage is running, so that calls nested in it are not counted again
+_depths = dict()
+
+
+"""
+
+Inputs:
+- function -> the function to time
+- stage -> the stage the function belongs to
+- count -> a function returning the number of work items of a call, or None to count one item per call
+
+Output:
+- A function that behaves like function while recording its calls, time, and work items. Calls made while
+another call of the same stage is running are not recorded.
+
+"""
+def _make_timer(function, stage, count):
+    starts_frame = stage == "step"
+    def timed(*args, **kwargs):
+        if _depths.get(stage, 0) > 0:
+            return function(*args, **kwargs)
+        if starts_frame:
+            _end_frame()
+        _depths[stage] = 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _depths[stage] = 0
+            items = 1 if count is None else count(*args, **kwargs)
+            for totals in (_totals, _frame_totals):
+                stage_totals = totals.setdefault(stage, [0, 0.0, 0])
+                stage_totals[0] += 1
+                stage_totals[1] += elapsed
+                stage_totals[2] += items
+    timed.__wrapped__ = function
+    timed.__doc__ = function.__doc__
+    timed.__name__ = function.__name__
+    return timed
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- N/A
+
+Description:
+This function stores the totals of the current frame as a finished frame, if anything was recorded in it.
+
+"""
+def _end_frame():
+    if len(_frame_totals) > 0:
+        _frames.append({stage: tuple(stage_totals) for stage, stage_totals in _frame_totals.items()})
+        _frame_totals.clear()
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- Boolean value indicating whether profiling is enabled
+
+"""
+def is_enabled():
+    return len(_originals) > 0
+
+"""
+
+Inputs:
+- step_classes -> the classes whose step() method simulates a frame, such as Simulator or MultiTracker
+
+Output:
+- N/A
+
+Description:
+This function starts profiling by wrapping every function in STAGES, and the step() method of every class in
+step_classes, with a timer. Anything recorded earlier is kept (see reset()).
+
+"""
+def enable(step_classes = ()):
+    if is_enabled():
+        return
+    for owner, name, stage, count in STAGES + [(step_class, "step", "step", None) for step_class in step_classes]:
+        function = getattr(owner, name)
+        _originals[(owner, name)] = function
+        setattr(owner, name, _make_timer(function, stage, count))
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- N/A
+
+Description:
+This function stops profiling and restores every original function.
+
+"""
+def disable():
+    for (owner, name), function in _originals.items():
+        setattr(owner, name, function)
+    _originals.clear()
+    _end_frame()
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- N/A
+
+Description:
+This function discards everything recorded so far.
+
+"""
+def reset():
+    _totals.clear()
+    _frame_totals.clear()
+    _frames.clear()
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- A list of dictionaries, one for each stage in order of total time, holding the stage's calls, work items,
+total seconds, mean microseconds per call, milliseconds per frame, and share of the time spent in steps
+
+"""
+def get_summary():
+    _end_frame()
+    frames = max(len(_frames), 1)
+    step_seconds = _totals.get("step", [0, 0.0, 0])[1]
+    summary = list()
+    for stage, (calls, seconds, items) in sorted(_totals.items(), key=lambda item: -item[1][1]):
+        summary.append({
+            "stage": stage,
+            "calls": calls,
+            "items": items,
+            "seconds": seconds,
+            "microseconds_per_call": seconds / max(calls, 1) * 1e6,
+            "milliseconds_per_frame": seconds / frames * 1e3,
+            "share_of_step": seconds / step_seconds if step_seconds > 0 else None,
+        })
+    return summary
+
+"""
+
+Inputs:
+- N/A
+
+Output:
+- N/A
+
+Description:
+This function prints get_summary() as a table.
+
+"""
+def print_summary():
+    summary = get_summary()
+    print("Frames =", len(_frames))
+    print("{:<12} {:>10} {:>12} {:>10} {:>12} {:>10} {:>8}".format("stage", "calls", "items", "total s", "us/call", "ms/frame", "share"))
+    for row in summary:
+        share = "" if row["share_of_step"] is None else "{:.1%}".format(row["share_of_step"])
+        print("{:<12} {:>10} {:>12} {:>10.4f} {:>12.1f} {:>10.3f} {:>8}".format(
+            row["stage"], row["calls"], row["items"], row["seconds"], row["microseconds_per_call"], row["milliseconds_per_frame"], share
+        ))
+
+"""
+
+Inputs:
+- path -> path of the file to write. Files ending in .json are written as JSON and every other file as CSV.
+
+Output:
+- N/A
+
+Description:
+This function writes the calls, work items, and seconds of every stage in every frame. In CSV files, each
+frame is a row with a <stage>_calls, <stage>_items, and <stage>_seconds column for every stage. In JSON files, each
+frame is an object mapping each stage to its calls, items, and seconds.
+
+"""
+def write_frames(path):
+    _end_frame()
+    stages = sorted(set(stage for frame in _frames for stage in frame))
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump({
+                "summary": get_summary(),
+                "frames": [
+                    {stage: {"calls": calls, "seconds": seconds, "items": items} for stage, (calls, seconds, items) in frame.items()}
+                    for frame in _frames
+                ],
+            }, f, indent = 2)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame"] + [stage + "_" + column for stage in stages for column in ("calls", "items", "seconds")])
+        for i, frame in enumerate(_frames):
+            row = [i]
+            for stage in stages:
+                calls, seconds, items = frame.get(stage, (0, 0.0, 0))
+                row += [calls, items, seconds]
+            writer.writerow(row)
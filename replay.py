@@ -0,0 +1,317 @@
+"""
+
+This file records simulations to trace files and replays them without running the tracking
+algorithm again. A trace stores, for every frame, what is needed to draw it: the position and
+orientation of every object, the tracking camera, the tracked object, and the cameras that received
+a handshake along with the predicted position of each handshake (see guess_new_position() in
+utils.py). Replaying a trace only draws these frames, so even long runs on large maps can be
+reviewed at full display speed, and any frame can be jumped to instantly.
+
+Traces (files ending in TRACE_EXTENSION) are stored column by column, like binary maps (see
+map_format.py):
+
+- header: the magic bytes b"CS4VTRC1" followed by five little-endian int64 values
+  (number of frames, number of objects, number of cameras, number of handshakes, length of the map name)
+- map name: the name of the traced map, encoded as UTF-8
+- tracking cameras: int32 array of the id of the tracking camera in each frame
+- tracked objects: int32 array of the id of the tracked object in each frame
+- positions: float64 (number of frames, number of objects, 2) array of every object's position
+- orientations: int16 (number of frames, number of objects) array of every object's orientation
+- handshake offsets: int64 array where the handshakes of frame i are rows offsets[i] to offsets[i + 1]
+  of the next two sections
+- handshake cameras: int32 array of the id of the receiving camera of each handshake
+- handshake positions: float64 (number of handshakes, 2) array of the predicted position of each handshake
+
+Every section starts at a multiple of 8 bytes and is memory-mapped when a trace is opened. Traces are
+recorded by passing --trace to simulator.py or by setting TRACE_OUTPUT in constants.py, and replayed
+with:
+
+    python replay.py run.trace
+
+While replaying, space pauses or resumes playback, the left and right arrow keys move one frame,
+the up and down arrow keys move REPLAY_SEEK_FRAMES frames, and home and end jump to the first and
+last frame.
+
+"""
+
+import argparse
+import constants
+import numpy as np
+import shutil
+import sys
+import tempfile
+import vision_cache
+import vision_store
+from environment import Environment
+
+TRACE_EXTENSION = ".trace"
+TRACE_MAGIC = b"CS4VTRC1"
+HEADER_FIELDS = 5
+
+
+"""
+
+Inputs:
+- counts -> the five values of the header of a trace
+
+Output:
+- A dictionary mapping each section name to its (offset, dtype, shape)
+
+"""
+def get_trace_sections(counts):
+    num_frames, num_objects, num_cameras, num_handshakes, map_name_length = (int(count) for count in counts)
+    sections = dict()
+    offset = len(TRACE_MAGIC) + 8 * HEADER_FIELDS
+    for name, dtype, shape in (
+        ("map_name", np.uint8, (map_name_length,)),
+        ("tracking_camera_ids", np.int32, (num_frames,)),
+        ("tracked_object_ids", np.int32, (num_frames,)),
+        ("positions", np.float64, (num_frames, num_objects, 2)),
+        ("orientations", np.int16, (num_frames, num_objects)),
+        ("handshake_offsets", np.int64, (num_frames + 1,)),
+        ("handshake_camera_ids", np.int32, (num_handshakes,)),
+        ("handshake_positions", np.float64, (num_handshakes, 2)),
+    ):
+        sections[name] = offset, dtype, shape
+        offset += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8
+    return sections
+
+class TraceRecorder:
+
+    """
+
+    Inputs:
+    - file_path -> path to write the trace to
+    - environment -> the environment being simulated
+
+    Description:
+    Frames are appended to one temporary file per section as they are recorded, so recording uses the same
+    small amount of memory no matter how many frames are recorded. The trace itself is written by close().
+
+    """
+    def __init__(self, file_path, environment):
+        self.file_path = file_path
+        self.environment = environment
+        self.num_frames = 0
+        self.num_handshakes = 0
+        self.dtypes = {name: np.dtype(dtype).newbyteorder("<") for name, (_, dtype, _) in get_trace_sections((0, 0, 0, 0, 0)).items()}
+        self.columns = {name: tempfile.TemporaryFile() for name in self.dtypes if name != "map_name"}
+        self.write_column("handshake_offsets", np.zeros(1, dtype=np.int64))
+
+    """
+
+    Inputs:
+    - name -> the name of a section
+    - values -> the values of the section to append
+
+    Output:
+    - N/A
+
+    """
+    def write_column(self, name, values):
+        self.columns[name].write(np.ascontiguousarray(values, dtype=self.dtypes[name]).tobytes())
+
+    """
+
+    Inputs:
+    - tracking_camera_id -> the id of the camera tracking the object in this frame
+    - tracked_object_id -> the id of the object being tracked in this frame
+    - receivers -> the cameras that received a handshake in this frame, in increasing order of id (the
+    handshake_receivers of the simulator)
+
+    Output:
+    - N/A
+
+    Description:
+    This function records the current state of the environment as the next frame of the trace. It is called after
+    every step of the simulation, once the handshakes of the frame have been sent.
+
+    """
+    def record(self, tracking_camera_id, tracked_object_id, receivers):
+        store = self.environment.object_store
+        self.write_column("tracking_camera_ids", [tracking_camera_id])
+        self.write_column("tracked_object_ids", [tracked_object_id])
+        self.write_column("positions", store.positions)
+        self.write_column("orientations", store.orientations)
+        self.write_column("handshake_camera_ids", [camera.id for camera in receivers])
+        self.write_column("handshake_positions", np.array([camera.handshake[0] for camera in receivers], dtype=np.float64).reshape(-1, 2))
+        self.num_frames += 1
+        self.num_handshakes += len(receivers)
+        self.write_column("handshake_offsets", [self.num_handshakes])
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - N/A
+
+    Description:
+    This function writes every recorded frame to the trace file and discards the temporary files.
+
+    """
+    def close(self):
+        map_name = (self.environment.file_name or "").encode("utf-8")
+        counts = (self.num_frames, len(self.environment.objects), len(self.environment.cameras), self.num_handshakes, len(map_name))
+        with open(self.file_path, "wb") as f:
+            f.write(TRACE_MAGIC)
+            f.write(np.array(counts, dtype="<i8").tobytes())
+            for name, (offset, _, _) in get_trace_sections(counts).items():
+                f.write(b"\0" * (offset - f.tell()))
+                if name == "map_name":
+                    f.write(map_name)
+                    continue
+                column = self.columns[name]
+                column.seek(0)
+                shutil.copyfileobj(column, f)
+                column.close()
+            f.write(b"\0" * (-f.tell() % 8))
+        self.columns = dict()
+
+class Trace:
+
+    """
+
+    Inputs:
+    - file_path -> path of a trace
+
+    Description:
+    Every section of the trace is memory-mapped, so opening a trace is fast and only the frames that are
+    actually shown are read from disk.
+
+    """
+    def __init__(self, file_path):
+        with open(file_path, "rb") as f:
+            if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+                raise ValueError(file_path + " is not a trace")
+            counts = np.frombuffer(f.read(8 * HEADER_FIELDS), dtype="<i8")
+        self.num_frames, self.num_objects, self.num_cameras = int(counts[0]), int(counts[1]), int(counts[2])
+        sections = dict()
+        for name, (offset, dtype, shape) in get_trace_sections(counts).items():
+            if int(np.prod(shape)) == 0:
+                sections[name] = np.zeros(shape, dtype=dtype)
+            else:
+                sections[name] = np.memmap(file_path, dtype=np.dtype(dtype).newbyteorder("<"), mode="r", offset=offset, shape=shape)
+        self.map_name = bytes(sections["map_name"]).decode("utf-8")
+        self.tracking_camera_ids = sections["tracking_camera_ids"]
+        self.tracked_object_ids = sections["tracked_object_ids"]
+        self.positions = sections["positions"]
+        self.orientations = sections["orientations"]
+        self.handshake_offsets = sections["handshake_offsets"]
+        self.handshake_camera_ids = sections["handshake_camera_ids"]
+        self.handshake_positions = sections["handshake_positions"]
+
+    def __len__(self):
+        return self.num_frames
+
+    """
+
+    Inputs:
+    - frame -> the index of a frame
+
+    Output:
+    - A 2-tuple of (camera ids, positions), the ids of the cameras that received a handshake in the frame and the
+    predicted position of each handshake
+
+    """
+    def get_handshakes(self, frame):
+        start, end = int(self.handshake_offsets[frame]), int(self.handshake_offsets[frame + 1])
+        return self.handshake_camera_ids[start:end], self.handshake_positions[start:end]
+
+    """
+
+    Inputs:
+    - frame -> the index of a frame
+    - environment -> an environment loaded from the traced map
+
+    Output:
+    - A 2-tuple of (tracking camera id, tracked object id) of the frame
+
+    Description:
+    This function sets the objects and handshakes of environment to their state in the frame, so that drawing
+    environment draws the frame. Handshakes only hold the predicted position, since drawing never uses the
+    appearance.
+
+    """
+    def apply_frame(self, frame, environment):
+        if len(environment.objects) != self.num_objects or len(environment.cameras) != self.num_cameras:
+            raise ValueError("The environment does not match the traced map " + self.map_name)
+        store = environment.object_store
+        store.positions[:] = self.positions[frame]
+        store.orientations[:] = self.orientations[frame]
+        store.versions += 1
+        environment.appearance_cache.clear()
+        for camera in environment.cameras:
+            camera.handshake = None
+        for camera_id, position in zip(*self.get_handshakes(frame)):
+            environment.cameras[int(camera_id)].handshake = (float(position[0]), float(position[1])), None
+        return int(self.tracking_camera_ids[frame]), int(self.tracked_object_ids[frame])
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded simulation.")
+    parser.add_argument("trace_path", help="path of a trace recorded by simulator.py or main.py")
+    parser.add_argument("--start", type=int, default=0, help="frame to start at")
+    parser.add_argument("--fps", type=int, default=constants.FPS, help="frame rate while playing (0 for as fast as possible)")
+    args = parser.parse_args()
+
+    trace = Trace(args.trace_path)
+    if len(trace) == 0:
+        print(args.trace_path, "has no frames")
+        return
+    environment = Environment(trace.map_name)
+    # Only the vision ranges of tracking cameras are drawn, so they are built when they are first needed
+    source = vision_cache.load_vision_ranges(environment) if constants.VISION_CACHE else None
+    environment.set_vision_store(vision_store.VisionStore(environment, constants.VISION_MEMORY_LIMIT, source))
+
+    # Pygame is only imported when replaying so that recording never loads it
+    import pygame
+    pygame.init()
+    window = pygame.display.set_mode((environment.size[1] * constants.SCALE, environment.size[0] * constants.SCALE))
+    clock = pygame.time.Clock()
+
+    frame = min(max(args.start, 0), len(trace) - 1)
+    shown_frame = None
+    playing = constants.AUTOPLAY
+    seeks = {
+        pygame.K_RIGHT: 1,
+        pygame.K_LEFT: -1,
+        pygame.K_UP: constants.REPLAY_SEEK_FRAMES,
+        pygame.K_DOWN: -constants.REPLAY_SEEK_FRAMES,
+    }
+    while True:
+        if frame != shown_frame:
+            tracking_camera_id, tracked_object_id = trace.apply_frame(frame, environment)
+            changed_rects = environment.draw_incremental(window, tracking_camera_id, tracked_object_id)
+            pygame.display.update(changed_rects)
+            pygame.display.set_caption("Frame " + str(frame) + " / " + str(len(trace) - 1))
+            # The vision ranges of the cameras the object may be handed off to are built while the frame is shown
+            environment.focus_vision([environment.objects[tracked_object_id].pos], [tracking_camera_id])
+            shown_frame = frame
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                environment.vision_store.close()
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    playing = not playing
+                elif event.key == pygame.K_HOME:
+                    frame = 0
+                elif event.key == pygame.K_END:
+                    frame = len(trace) - 1
+                elif event.key in seeks:
+                    frame = min(max(frame + seeks[event.key], 0), len(trace) - 1)
+
+        if playing:
+            if frame < len(trace) - 1:
+                frame += 1
+            else:
+                playing = False
+            clock.tick(args.fps)
+        else:
+            clock.tick(20)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+
+A simulator runs the handshake tracking algorithm described in main.py without any visuals. It
+never imports pygame, never sleeps between frames, and records the result of every frame, which
+makes it suitable for evaluating long runs and many parameter settings.
+
+The simulator can also be ran from the command line over any map in the maps folder:
+
+    python simulator.py many_cameras.txt --frames 1000 --output results.csv
+
+Passing --trace records the simulation to a trace file that can be replayed with replay.py.
+
+"""
+
+import argparse
+import constants
+import csv
+import profiler
+import replay
+import time
+import utils
+from collections import namedtuple
+from environment import Environment
+
+# The outcome of a single frame of a simulation. correct is True if the tracked object is the
+# object that the simulation started out tracking.
+FrameResult = namedtuple("FrameResult", ["frame", "tracking_camera_id", "tracked_object_id", "correct"])
+
+class Simulator:
+
+    """
+    
+    Inputs:
+    - environment -> an environment whose vision ranges have been initialized
+    - tracked_object_id -> the id of the object to track
+    - weights -> a 3-tuple of the position, appearance, and size weights used for handshake matching.
+    If None, POS_CONST, APPEARANCE_CONST, and SIZE_CONST are used.
+
+    Description:
+    The camera that initially tracks the object is the first camera that can see it
+    (step 2 of the algorithm in main.py).
+
+    """
+    def __init__(self, environment, tracked_object_id = 0, weights = None):
+        self.environment = environment
+        self.weights = weights
+        self.true_object_id = tracked_object_id
+        self.tracked_object_id = tracked_object_id
+        self.tracking_camera = None
+        self.frame = 0
+        # Cameras that received a handshake in the previous frame, in increasing order of id. Only these cameras
+        # have to be checked in step 3a and cleared in step 3b.
+        self.handshake_receivers = list()
+        utils.reset_handshakes(environment.cameras)
+        for camera in utils.get_cameras_seeing_object(environment.objects[tracked_object_id], environment):
+            if utils.can_camera_see_object(camera, environment.objects[tracked_object_id], environment):
+                self.tracking_camera = camera
+                break
+        if self.tracking_camera is None:
+            raise ValueError("No camera can see object " + str(tracked_object_id))
+
+    """
+    
+    Inputs:
+    - N/A
+
+    Output:
+    - The FrameResult of the frame
+
+    Description:
+    This function runs step 3 of the algorithm in main.py for a single frame.
+
+    """
+    def step(self):
+        environment = self.environment
+        c = self.tracking_camera
+
+        # a) If c cannot see the tracked object, check each camera c2 that recently received a handshake
+        tracked_object = environment.objects[self.tracked_object_id]
+        if not utils.can_camera_see_object(c, tracked_object, environment):
+            receivers = self.handshake_receivers
+            if constants.HANDOFF_GRAPH:
+                # Cameras that the object is moving towards are checked first
+                receivers = environment.get_camera_graph().order_handoff_candidates(c, tracked_object, receivers)
+            for camera in receivers:
+                # i) If c2 can see the tracked object, set c = c2 and break the loop
+                candidates = utils.get_candidate_objects(camera, camera.handshake[0], environment)
+                best_match = utils.get_best_object_match(camera, candidates, camera.handshake[0], camera.handshake[1], environment, verbose = False, weights = self.weights)
+                if best_match is not None:
+                    c = camera
+                    self.tracked_object_id = best_match.id
+                    break
+
+        # b) Record the tracked object's location and visual representation
+        utils.reset_handshakes(self.handshake_receivers)
+        self.handshake_receivers = list()
+        environment.step()
+        tracked_object = environment.objects[self.tracked_object_id]
+
+        # c) For each neighbor of c as c2 (only cameras whose vision range covers the object are considered),
+        for camera in utils.get_cameras_seeing_object(tracked_object, environment):
+            # i) If the object is in c2's vision range, send a handshake to c2
+            if c.id != camera.id and utils.can_camera_see_object(camera, tracked_object, environment):
+                utils.send_handshake(c, camera, tracked_object, environment)
+                self.handshake_receivers.append(camera)
+
+        self.tracking_camera = c
+        environment.focus_vision([tracked_object.pos], [c.id])
+        result = FrameResult(self.frame, c.id, self.tracked_object_id, self.tracked_object_id == self.true_object_id)
+        self.frame += 1
+        return result
+
+    """
+    
+    Inputs:
+    - frames -> the number of frames to simulate
+    - recorder -> if not None, a TraceRecorder (see replay.py) that records every simulated frame
+
+    Output:
+    - A list of the FrameResult of every simulated frame
+
+    """
+    def run(self, frames, recorder = None):
+        results = list()
+        for _ in range(frames):
+            result = self.step()
+            if recorder is not None:
+                recorder.record(result.tracking_camera_id, result.tracked_object_id, self.handshake_receivers)
+            results.append(result)
+        return results
+
+"""
+    
+Inputs:
+- results -> a list of FrameResult
+
+Output:
+- A 2-tuple of (accuracy, hand-offs), where accuracy is the fraction of frames in which the correct object was
+tracked and hand-offs is the number of times the tracking camera changed
+
+"""
+def summarize(results):
+    if len(results) == 0:
+        return 0.0, 0
+    accuracy = sum(result.correct for result in results) / len(results)
+    hand_offs = sum(1 for previous, current in zip(results, results[1:]) if previous.tracking_camera_id != current.tracking_camera_id)
+    return accuracy, hand_offs
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the handshake tracking algorithm without visuals.")
+    parser.add_argument("map_name", help="name of a file within the maps folder")
+    parser.add_argument("--frames", type=int, default=1000, help="number of frames to simulate")
+    parser.add_argument("--object", type=int, default=0, help="id of the object to track")
+    parser.add_argument("--output", help="if given, write the result of every frame to this CSV file")
+    parser.add_argument("--trace", help="if given, record the simulation to this trace file (see replay.py)")
+    parser.add_argument("--profile", help="if given, time every stage of every frame, print a summary, and write the time of every frame to this CSV (or .json) file")
+    args = parser.parse_args()
+
+    environment = Environment(args.map_name)
+    utils.initialize_vision_ranges(environment)
+    simulator = Simulator(environment, args.object)
+    if args.profile is not None:
+        profiler.enable([Simulator])
+    recorder = None if args.trace is None else replay.TraceRecorder(args.trace, environment)
+    start = time.perf_counter()
+    results = simulator.run(args.frames, recorder)
+    elapsed = time.perf_counter() - start
+    if recorder is not None:
+        recorder.close()
+
+    accuracy, hand_offs = summarize(results)
+    print("Frames =", len(results), "Frames per second =", round(len(results) / max(elapsed, 1e-9), 1))
+    print("Accuracy =", accuracy, "Hand-offs =", hand_offs)
+    if args.output is not None:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(FrameResult._fields)
+            writer.writerows(results)
+    if args.profile is not None:
+        profiler.disable()
+        profiler.print_summary()
+        profiler.write_frames(args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+
+This file runs parameter sweeps over the handshake matching weights (POS_CONST, APPEARANCE_CONST
+and SIZE_CONST). Every configuration is simulated without visuals on every requested map, and the
+tracking accuracy and number of hand-offs of each run are written to a CSV table.
+
+Vision ranges are computed once per map before the sweep starts and saved to the map's vision
+cache (see vision_cache.py). Every worker process memory-maps the same cache file, so the vision
+ranges are shared between processes instead of being recomputed or copied.
+
+Example (a 3x3x3 grid over every map):
+
+    python sweep.py --pos 0.05 0.1 0.2 --appearance 0.5 1 2 --size 2 4 8 --frames 500 --output sweep.csv
+
+Example (200 random configurations drawn between the smallest and largest value of each weight):
+
+    python sweep.py --pos 0.01 1 --appearance 0.1 10 --size 0.5 16 --samples 200 --seed 1
+
+"""
+
+import argparse
+import constants
+import csv
+import glob
+import itertools
+import numpy as np
+import os
+import simulator
+import utils
+import vision_cache
+from concurrent.futures import ProcessPoolExecutor
+from environment import Environment
+
+# Packed vision ranges of every map, loaded once per worker process
+_worker_vision = dict()
+
+"""
+    
+Inputs:
+- map_names -> the names of the maps that will be simulated
+
+Output:
+- N/A
+
+Description:
+This function makes sure that every map has an up to date vision cache, building the vision ranges of the maps that
+do not have one yet. Nothing is built if vision ranges are built lazily (see VISION_LAZY in constants.py), since every
+run then only builds the vision ranges it uses.
+
+"""
+def prepare_vision_caches(map_names):
+    if constants.VISION_LAZY:
+        return
+    vision_cache_enabled = constants.VISION_CACHE
+    constants.VISION_CACHE = True
+    try:
+        for map_name in map_names:
+            utils.initialize_vision_ranges(Environment(map_name))
+    finally:
+        constants.VISION_CACHE = vision_cache_enabled
+
+"""
+    
+Inputs:
+- map_name -> the name of a map whose vision cache is up to date
+
+Output:
+- A freshly loaded environment of the map whose vision ranges are shared with every other environment of the same
+map in this process. If vision ranges are built lazily (see VISION_LAZY in constants.py), every environment has its
+own vision store instead, which reads from the vision cache if there is one.
+
+"""
+def load_environment(map_name):
+    environment = Environment(map_name)
+    if map_name in _worker_vision:
+        environment.set_vision_ranges(_worker_vision[map_name])
+        return environment
+    vision_ranges = vision_cache.load_vision_ranges(environment) if not constants.VISION_LAZY else None
+    if vision_ranges is None:
+        utils.initialize_vision_ranges(environment)
+    else:
+        environment.set_vision_ranges(vision_ranges)
+    if environment.vision_store is None:
+        _worker_vision[map_name] = environment.vision_ranges
+    return environment
+
+"""
+    
+Inputs:
+- map_name -> the name of a map
+- weights -> a 3-tuple of the position, appearance, and size weights
+- frames -> the number of frames to simulate
+- tracked_object_id -> the id of the object to track
+
+Output:
+- A dictionary describing the outcome of the simulation (one row of the sweep table)
+
+"""
+def run_configuration(map_name, weights, frames, tracked_object_id):
+    environment = load_environment(map_name)
+    try:
+        results = simulator.Simulator(environment, tracked_object_id, weights).run(frames)
+    finally:
+        if environment.vision_store is not None:
+            environment.vision_store.close()
+    accuracy, hand_offs = simulator.summarize(results)
+    return {
+        "map": map_name,
+        "pos_const": weights[0],
+        "appearance_const": weights[1],
+        "size_const": weights[2],
+        "frames": len(results),
+        "accuracy": accuracy,
+        "hand_offs": hand_offs,
+    }
+
+"""
+    
+Inputs:
+- pos_values, appearance_values, size_values -> the values of each weight
+- samples -> if None, every combination of the values is returned. Otherwise, this many configurations are drawn
+log-uniformly between the smallest and largest value of each weight.
+- seed -> the random seed used when drawing samples
+
+Output:
+- A list of 3-tuples of weights
+
+"""
+def get_configurations(pos_values, appearance_values, size_values, samples = None, seed = 0):
+    if samples is None:
+        return list(itertools.product(pos_values, appearance_values, size_values))
+    rng = np.random.default_rng(seed)
+    columns = list()
+    for values in (pos_values, appearance_values, size_values):
+        low, high = min(values), max(values)
+        if low > 0:
+            columns.append(np.exp(rng.uniform(np.log(low), np.log(high), samples)))
+        else:
+            columns.append(rng.uniform(low, high, samples))
+    return [tuple(float(value) for value in configuration) for configuration in zip(*columns)]
+
+"""
+    
+Inputs:
+- map_names -> the names of the maps to simulate
+- configurations -> a list of 3-tuples of weights
+- frames -> the number of frames to simulate per run
+- workers -> the number of processes to use. If 1, every run happens in this process.
+- tracked_object_id -> the id of the object to track
+
+Output:
+- A list of the rows produced by run_configuration, one per map and configuration
+
+"""
+def run_sweep(map_names, configurations, frames, workers, tracked_object_id = 0):
+    prepare_vision_caches(map_names)
+    runs = [(map_name, weights) for map_name in map_names for weights in configurations]
+    if workers == 1:
+        return [run_configuration(map_name, weights, frames, tracked_object_id) for map_name, weights in runs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = [executor.submit(run_configuration, map_name, weights, frames, tracked_object_id) for map_name, weights in runs]
+        return [task.result() for task in tasks]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the handshake matching weights over headless simulations.")
+    parser.add_argument("--maps", nargs="+", help="names of files within the maps folder (default: every map)")
+    parser.add_argument("--pos", nargs="+", type=float, default=[constants.POS_CONST], help="values of POS_CONST")
+    parser.add_argument("--appearance", nargs="+", type=float, default=[constants.APPEARANCE_CONST], help="values of APPEARANCE_CONST")
+    parser.add_argument("--size", nargs="+", type=float, default=[constants.SIZE_CONST], help="values of SIZE_CONST")
+    parser.add_argument("--samples", type=int, help="draw this many random configurations instead of using the full grid")
+    parser.add_argument("--seed", type=int, default=0, help="random seed used with --samples")
+    parser.add_argument("--frames", type=int, default=500, help="number of frames to simulate per run")
+    parser.add_argument("--object", type=int, default=0, help="id of the object to track")
+    parser.add_argument("--workers", type=int, default=0, help="number of processes (0 uses one per CPU core)")
+    parser.add_argument("--output", default="sweep.csv", help="CSV file the table is written to")
+    args = parser.parse_args()
+
+    map_names = args.maps
+    if map_names is None:
+        map_names = sorted(os.path.basename(path) for path in glob.glob("maps/*.txt"))
+    configurations = get_configurations(args.pos, args.appearance, args.size, args.samples, args.seed)
+    rows = run_sweep(map_names, configurations, args.frames, args.workers or os.cpu_count() or 1, args.object)
+
+    if len(rows) == 0:
+        print("Nothing to simulate")
+        return
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    for row in sorted(rows, key=lambda row: (row["map"], -row["accuracy"], row["hand_offs"])):
+        print(row["map"], "pos =", row["pos_const"], "appearance =", row["appearance_const"], "size =", row["size_const"],
+              "accuracy =", round(row["accuracy"], 4), "hand-offs =", row["hand_offs"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import constants
+import numpy as np
+import os
+import pytest
+import shutil
+import utils
+from environment import Environment
+from object_store import ObjectStore
+
+MAPS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+
+def load_environment(map_name, tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "maps", exist_ok=True)
+    shutil.copy(os.path.join(MAPS_FOLDER, map_name), tmp_path / "maps")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(constants, "VISION_CACHE", False)
+    monkeypatch.setattr(constants, "VISION_LAZY", False)
+    return Environment(map_name)
+
+# Movement of a single object as it was done before objects were kept in an ObjectStore
+class PathFollower:
+
+    def __init__(self, path):
+        self.path = path
+        self.x, self.y = float(path[0][0]), float(path[0][1])
+        self.time_until_change = path[0][2]
+        self.orientation = path[0][3]
+        self.path_progress = 0
+        self.version = 0
+
+    def progress_on_path(self):
+        if self.path_progress == len(self.path) - 1:
+            return
+        if self.time_until_change == 0:
+            self.path_progress += 1
+            self.time_until_change = self.path[self.path_progress][2]
+        if self.path_progress == len(self.path) - 1:
+            return
+        prev_x, prev_y, speed, orientation = self.path[self.path_progress]
+        dest_x, dest_y, _, _ = self.path[self.path_progress + 1]
+        self.x += (dest_x - prev_x) / speed
+        self.y += (dest_y - prev_y) / speed
+        self.time_until_change -= 1
+        self.orientation = orientation
+        self.version += 1
+
+def test_batched_visibility_matches_single_lines(tmp_path, monkeypatch):
+    environment = load_environment("many_cameras.txt", tmp_path, monkeypatch)
+    height, width = environment.map.shape
+    rng = np.random.default_rng(0)
+    starts = np.stack((rng.integers(0, width, 2000), rng.integers(0, height, 2000)), axis=1)
+    ends = np.stack((rng.integers(0, width, 2000), rng.integers(0, height, 2000)), axis=1)
+    expected = [utils.is_pos_visible_from_pos(tuple(start), tuple(end), environment) for start, end in zip(starts.tolist(), ends.tolist())]
+    assert utils.are_positions_visible(starts, ends, environment).tolist() == expected
+
+    start = tuple(starts[0].tolist())
+    expected = [utils.is_pos_visible_from_pos(start, tuple(end), environment) for end in ends.tolist()]
+    assert utils.are_positions_visible(start, ends, environment).tolist() == expected
+
+@pytest.mark.parametrize("algorithm", ["bresenham", "shadowcast"])
+def test_set_wall_matches_full_rebuild(tmp_path, monkeypatch, algorithm):
+    monkeypatch.setattr(constants, "VISION_ALGORITHM", algorithm)
+    environment = load_environment("many_cameras.txt", tmp_path, monkeypatch)
+    utils.initialize_vision_ranges(environment)
+    height, width = environment.map.shape
+    camera_positions = set(camera.pos for camera in environment.cameras)
+    rng = np.random.default_rng(1)
+    changes = 0
+    while changes < 10:
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        if (x, y) in camera_positions:
+            continue
+        environment.set_wall(x, y, environment.map[y, x] == 0)
+        changes += 1
+
+    rebuilt = Environment("many_cameras.txt")
+    rebuilt.map[:] = environment.map
+    utils.initialize_vision_ranges(rebuilt)
+    assert np.array_equal(environment.vision_ranges.visible, rebuilt.vision_ranges.visible)
+    assert np.array_equal(environment.vision_ranges.blocked, rebuilt.vision_ranges.blocked)
+    assert np.array_equal(environment.reach_boxes, rebuilt.vision_ranges.get_reach_boxes())
+
+@pytest.mark.parametrize("select", [False, True])
+def test_object_store_matches_path_following(select):
+    rng = np.random.default_rng(2)
+    paths = [
+        [[int(rng.integers(0, 50)), int(rng.integers(0, 50)), int(rng.integers(1, 7)), int(rng.integers(0, 4))] for _ in range(int(rng.integers(1, 6)))]
+        for _ in range(200)
+    ]
+    store = ObjectStore(paths)
+    followers = [PathFollower(path) for path in paths]
+    for _ in range(60):
+        indices = np.flatnonzero(rng.random(len(paths)) < 0.5) if select else np.arange(len(paths))
+        versions = [follower.version for follower in followers]
+        moved = store.step(indices if select else None)
+        for i in indices.tolist():
+            followers[i].progress_on_path()
+        assert moved.tolist() == [i for i in indices.tolist() if followers[i].version != versions[i]]
+        assert store.positions.tolist() == [[follower.x, follower.y] for follower in followers]
+        assert store.orientations.tolist() == [follower.orientation for follower in followers]
+        assert store.versions.tolist() == [follower.version for follower in followers]
+        assert store.path_progress.tolist() == [follower.path_progress for follower in followers]
+        assert store.time_until_change.tolist() == [follower.time_until_change for follower in followers]
+
+def test_object_grid_query_matches_brute_force(tmp_path, monkeypatch):
+    environment = load_environment("many_objects.txt", tmp_path, monkeypatch)
+    height, width = environment.map.shape
+    rng = np.random.default_rng(3)
+    for _ in range(30):
+        environment.step()
+        for _ in range(10):
+            pos = float(rng.uniform(0, width)), float(rng.uniform(0, height))
+            radius = float(rng.uniform(0, 40))
+            expected = [
+                object.id for object in environment.objects
+                if abs(object.pos[0] - pos[0]) + abs(object.pos[1] - pos[1]) <= radius
+            ]
+            assert [object.id for object in environment.object_grid.query(pos, radius)] == expected
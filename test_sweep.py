@@ -0,0 +1,33 @@
+import constants
+import glob
+import os
+import shutil
+import sweep
+
+MAPS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+
+def test_lazy_sweep_without_vision_cache(tmp_path, monkeypatch):
+    os.mkdir(tmp_path / "maps")
+    shutil.copy(os.path.join(MAPS_FOLDER, "many_cameras.txt"), tmp_path / "maps")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sweep, "_worker_vision", dict())
+    monkeypatch.setattr(constants, "VISION_CACHE", True)
+    configurations = [(0.1, 1.0, 4.0), (0.2, 1.0, 4.0), (0.1, 2.0, 4.0)]
+
+    monkeypatch.setattr(constants, "VISION_LAZY", True)
+    lazy_rows = sweep.run_sweep(["many_cameras.txt"], configurations, 50, 1)
+    assert [(row["pos_const"], row["appearance_const"], row["size_const"]) for row in lazy_rows] == configurations
+    assert all(row["frames"] == 50 for row in lazy_rows)
+    # Lazy vision stores never write a vision cache
+    assert glob.glob("maps/*.vision.npy") == []
+
+def test_sweep_restores_vision_cache_setting(tmp_path, monkeypatch):
+    os.mkdir(tmp_path / "maps")
+    shutil.copy(os.path.join(MAPS_FOLDER, "simple_test.txt"), tmp_path / "maps")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sweep, "_worker_vision", dict())
+    monkeypatch.setattr(constants, "VISION_LAZY", False)
+    monkeypatch.setattr(constants, "VISION_CACHE", False)
+    rows = sweep.run_sweep(["simple_test.txt"], [(0.1, 1.0, 4.0)], 20, 1)
+    assert len(rows) == 1
+    assert constants.VISION_CACHE is False
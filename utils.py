@@ -5,9 +5,24 @@ This file contains utility methods used elsewhere in the code.
 """
 
 import constants
-import copy
 import numpy as np
-from queue import Queue
+import os
+import vision_cache
+import vision_store
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from packed_vision import PackedVisionRanges
+from types import SimpleNamespace
+
+# Upper bound on the number of tiles traced at once by are_positions_visible
+VISIBILITY_CHUNK_ELEMENTS = 1 << 22
+
+# The eight tiles surrounding a tile, as (dx, dy) offsets
+NEIGHBOR_OFFSETS = np.array([(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)], dtype=np.int64)
+
+# Per-process state of the workers started by initialize_vision_ranges_in_parallel
+_worker_memory = None
+_worker_environment = None
 
 
 """
@@ -85,50 +100,436 @@ def is_pos_visible_from_pos(start, end, environment):
 """
     
 Inputs:
+- starts -> array-like of N starting positions, each (x,y)
+- ends -> array-like of N ending positions, each (x,y)
+- environment -> the environment containing the start and end positions
+
+Output:
+- Boolean array of length N where entry i indicates whether ends[i] is visible from starts[i]
+
+Description:
+This function is a batched version of is_pos_visible_from_pos. Instead of walking each line one tile at a time,
+it uses the closed form of Bresenham's Line Algorithm (the minor coordinate at step k of a line with major delta a
+and minor delta b is ceil((2bk - a) / 2a)) to compute every tile of every line at once with NumPy. Lines are sorted
+by length and processed in chunks so that memory use stays bounded on large maps. A single start or end may be
+given instead of N of them, in which case it is broadcast against the other argument.
+
+"""
+def are_positions_visible(starts, ends, environment):
+    starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.int64).reshape(-1, 2)
+    starts, ends = np.broadcast_arrays(starts, ends)
+    visible = np.ones(len(starts), dtype=bool)
+    if len(starts) == 0:
+        return visible
+
+    x0, y0 = starts[:, 0], starts[:, 1]
+    x1, y1 = ends[:, 0], ends[:, 1]
+
+    # Lines are "low" when they iterate over x and "high" when they iterate over y. Both are always
+    # drawn from the endpoint with the smaller major coordinate, exactly as in is_pos_visible_from_pos.
+    is_low = np.abs(y1 - y0) < np.abs(x1 - x0)
+    swap = np.where(is_low, x0 > x1, y0 > y1)
+    ax, ay = np.where(swap, x1, x0), np.where(swap, y1, y0)
+    bx, by = np.where(swap, x0, x1), np.where(swap, y0, y1)
+    major_start = np.where(is_low, ax, ay)
+    minor_start = np.where(is_low, ay, ax)
+    major_delta = np.where(is_low, bx - ax, by - ay)
+    minor_delta = np.where(is_low, by - ay, bx - ax)
+    minor_step = np.where(minor_delta < 0, -1, 1)
+    minor_delta = np.abs(minor_delta)
+    lengths = major_delta + 1
+
+    order = np.argsort(lengths, kind="stable")
+    chunk_start = 0
+    while chunk_start < len(order):
+        # Lines are sorted by length, so the longest line of a chunk is its last one
+        chunk_end = min(len(order), chunk_start + max(1, VISIBILITY_CHUNK_ELEMENTS // lengths[order[chunk_start]]))
+        chunk_size = max(1, VISIBILITY_CHUNK_ELEMENTS // lengths[order[chunk_end - 1]])
+        chunk = order[chunk_start:chunk_start + chunk_size]
+        max_length = lengths[chunk[-1]]
+        k = np.arange(max_length)
+        on_line = k < lengths[chunk, None]
+        k = np.where(on_line, k, 0)
+
+        a = major_delta[chunk, None]
+        b = minor_delta[chunk, None]
+        minor_offset = -((a - 2 * b * k) // np.maximum(2 * a, 1))
+        major = major_start[chunk, None] + k
+        minor = minor_start[chunk, None] + minor_step[chunk, None] * minor_offset
+
+        low = is_low[chunk, None]
+        xs = np.where(low, major, minor)
+        ys = np.where(low, minor, major)
+        blocked = (environment.map[ys, xs] > 0) & on_line
+        visible[chunk] = ~blocked.any(axis=1)
+        chunk_start += len(chunk)
+    return visible
+
+"""
+    
+Inputs:
+- start -> starting position as a 2-tuple of (x,y)
+- ends -> array-like of N ending positions, each (x,y)
+- environment -> the environment containing the start and end positions
+
+Output:
+- Boolean array of length N where entry i indicates whether ends[i] is visible from start
+
+"""
+def are_positions_visible_from_pos(start, ends, environment):
+    return are_positions_visible(start, ends, environment)
+
+"""
+    
+Inputs:
+- starts -> array-like of S starting positions, each (x,y)
+- ends -> array-like of N ending positions, each (x,y)
 - environment -> the environment containing the start and end positions
 
+Output:
+- Boolean array of shape (S, N) where entry [i, j] indicates whether ends[j] is visible from starts[i]
+
+"""
+def get_visibility_matrix(starts, ends, environment):
+    starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.int64).reshape(-1, 2)
+    pair_starts = np.repeat(starts, len(ends), axis=0)
+    pair_ends = np.tile(ends, (len(starts), 1))
+    return are_positions_visible(pair_starts, pair_ends, environment).reshape(len(starts), len(ends))
+
+"""
+    
+Inputs:
+- position -> the (x,y) position of a camera
+- environment -> the environment containing the camera
+
+Output:
+- 2D array of the same size as environment.map describing the vision range of a camera at position. Each tile is
+0 if it was never reached, 1 if it is visible, and 2 if it was reached but is blocked by a wall.
+
+Description:
+This function performs the same Breadth-First Search as initialize_vision_ranges always has, but processes
+the search one level at a time so that every tile in a level can be tested with a single call to
+are_positions_visible_from_pos.
+
+If known is given, it is a 2D array of the same size as environment.map holding the line of sight of tiles that is
+already known (1 for visible, 2 for blocked, and 0 for unknown), usually taken from an earlier vision range of the
+same camera. Only tiles whose line of sight is unknown are traced.
+
+"""
+def get_bresenham_vision_range(position, environment, known = None):
+    vision_range = np.zeros(environment.size, dtype=np.uint8)
+    height, width = vision_range.shape
+    frontier = np.array([position], dtype=np.int64)
+    while len(frontier) > 0:
+        # Only keep tiles that are on the map, have not been reached yet, and are not walls
+        on_map = (frontier[:, 0] >= 0) & (frontier[:, 0] < width) & (frontier[:, 1] >= 0) & (frontier[:, 1] < height)
+        frontier = frontier[on_map]
+        flat = np.unique(frontier[:, 1] * width + frontier[:, 0])
+        frontier = np.stack((flat % width, flat // width), axis=1)
+        xs, ys = frontier[:, 0], frontier[:, 1]
+        unvisited = (vision_range[ys, xs] == 0) & (environment.map[ys, xs] == 0)
+        frontier, xs, ys = frontier[unvisited], xs[unvisited], ys[unvisited]
+        if len(frontier) == 0:
+            break
+
+        if known is None:
+            visible = are_positions_visible_from_pos(position, frontier, environment)
+        else:
+            frontier_known = known[ys, xs]
+            visible = frontier_known == 1
+            unknown = frontier_known == 0
+            if np.any(unknown):
+                visible[unknown] = are_positions_visible_from_pos(position, frontier[unknown], environment)
+        vision_range[ys, xs] = np.where(visible, 1, 2)
+        frontier = (frontier[visible, None, :] + NEIGHBOR_OFFSETS[None, :, :]).reshape(-1, 2)
+    return vision_range
+
+"""
+    
+Inputs:
+- position -> the (x,y) position of a camera
+- environment -> the environment containing the camera
+
+Output:
+- 2D array of the same size as environment.map describing the vision range of a camera at position, using the
+same 0/1/2 values as get_bresenham_vision_range
+
+Description:
+This function builds a vision range with symmetric shadow casting. Each of the four quadrants around the camera
+is scanned one row at a time, and walls split a row into the slope intervals that are scanned in the next row, so
+every tile is touched at most once. Rows are processed with NumPy and only runs of floor tiles are handled in Python.
+
+The result differs from get_bresenham_vision_range in a few documented ways:
+- Visibility is symmetric (a tile is visible from the camera exactly when the camera is visible from that tile),
+  whereas Bresenham's lines depend on which endpoint they are drawn from.
+- A tile is visible when the line from the center of the camera's tile to the center of the tile passes between
+  walls, so some tiles that peek around wall corners differ from the Bresenham result.
+- Tiles are marked 2 when they are not walls, are not visible, and border a visible tile. These are exactly the
+  tiles that the Breadth-First Search of get_bresenham_vision_range would have reached and rejected.
+
+"""
+def get_shadowcast_vision_range(position, environment):
+    vision_range = np.zeros(environment.size, dtype=np.uint8)
+    height, width = vision_range.shape
+    ox, oy = int(position[0]), int(position[1])
+    if environment.map[oy, ox] != 0:
+        return vision_range
+    vision_range[oy, ox] = 1
+
+    for quadrant in range(4):
+        # Rows are (depth, start slope numerator, start slope denominator, end slope numerator, end slope denominator)
+        rows = [(1, -1, 1, 1, 1)]
+        while len(rows) > 0:
+            depth, start_num, start_den, end_num, end_den = rows.pop()
+
+            # Quadrants 0 and 1 scan map rows above and below the camera, 2 and 3 scan map columns right and left of it
+            line_index = (oy - depth, oy + depth, ox + depth, ox - depth)[quadrant]
+            if quadrant < 2:
+                if line_index < 0 or line_index >= height:
+                    continue
+                map_line, vision_line, center = environment.map[line_index], vision_range[line_index], ox
+            else:
+                if line_index < 0 or line_index >= width:
+                    continue
+                map_line, vision_line, center = environment.map[:, line_index], vision_range[:, line_index], oy
+
+            # Columns covered by the row, rounding ties towards the middle of the row. Tiles off the map count as walls.
+            min_col = (2 * depth * start_num + start_den) // (2 * start_den)
+            max_col = -((end_den - 2 * depth * end_num) // (2 * end_den))
+            first_col = max(min_col, -center)
+            last_col = min(max_col, len(map_line) - 1 - center)
+            if first_col > last_col:
+                continue
+
+            cols = np.arange(first_col, last_col + 1)
+            is_floor = map_line[center + first_col:center + last_col + 1] == 0
+            is_symmetric = (cols * start_den >= depth * start_num) & (cols * end_den <= depth * end_num)
+            vision_line[center + cols[is_floor & is_symmetric]] = 1
+
+            # Every run of floor tiles casts the next row, narrowed by the walls on either side of it
+            edges = np.diff(np.concatenate(([0], is_floor.astype(np.int8), [0])))
+            for run_start, run_end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+                first_floor = first_col + run_start
+                last_floor = first_col + run_end - 1
+                child = [depth + 1, start_num, start_den, end_num, end_den]
+                if first_floor > min_col:
+                    child[1:3] = 2 * first_floor - 1, 2 * depth
+                if last_floor < max_col:
+                    child[3:5] = 2 * last_floor + 1, 2 * depth
+                rows.append(tuple(child))
+
+    # Mark the tiles bordering the visible area that could not be seen
+    visible = vision_range == 1
+    bordering = np.zeros_like(visible)
+    padded = np.pad(visible, 1)
+    for dx, dy in NEIGHBOR_OFFSETS:
+        bordering |= padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+    vision_range[bordering & ~visible & (environment.map == 0)] = 2
+    return vision_range
+
+"""
+    
+Inputs:
+- position -> the (x,y) position of a camera
+- environment -> the environment containing the camera
+- algorithm -> either "bresenham" or "shadowcast". If None, VISION_ALGORITHM is used.
+
+Output:
+- 2D array describing the vision range of a camera at position
+
+"""
+def get_vision_range(position, environment, algorithm = None):
+    if algorithm is None:
+        algorithm = constants.VISION_ALGORITHM
+    if algorithm == "bresenham":
+        return get_bresenham_vision_range(position, environment)
+    elif algorithm == "shadowcast":
+        return get_shadowcast_vision_range(position, environment)
+    else:
+        raise ValueError("Unknown vision algorithm: " + str(algorithm))
+
+"""
+    
+Inputs:
+- position -> the (x,y) position of a camera
+- tile -> the (x,y) position of a tile
+- xs -> array of the x positions of tiles to test
+- ys -> array of the y positions of tiles to test
+
+Output:
+- Boolean array that is True for every tested tile whose line of sight from position may pass through tile
+
+Description:
+A tile of a Bresenham line is never more than half a tile away from the straight line between its endpoints, so
+the line from position to a tile can only pass through tile if the straight line passes within half a tile of it.
+A full tile of margin is used, which also covers the lines between tile centers used by shadow casting and makes
+the result a slightly larger sector than necessary.
+
+"""
+def may_line_pass_through_tile(position, tile, xs, ys):
+    dx, dy = xs - position[0], ys - position[1]
+    tile_x, tile_y = tile[0] - position[0], tile[1] - position[1]
+    length = np.sqrt(dx * dx + dy * dy)
+    distance_to_line = np.abs(dx * tile_y - dy * tile_x)
+    projection = dx * tile_x + dy * tile_y
+    return (length > 0) & (distance_to_line <= length) & (projection >= -length) & (projection <= length * length + length)
+
+"""
+    
+Inputs:
+- camera -> a camera whose vision range was built before tile changed between a wall and floor
+- tile -> the (x,y) position of the changed tile
+- environment -> the environment containing the camera, whose map already contains the change
+
+Output:
+- The camera's new vision range
+
+Description:
+Only the lines of sight that pass through the changed tile can change, so with the "bresenham" algorithm the
+lines of sight of every tile outside of the sector found by may_line_pass_through_tile() are reused from the
+camera's old vision range and only the tiles in the sector are traced again. The Breadth-First Search itself still
+walks every tile it reaches, because a tile outside of the sector is only reached through a visible neighbor, and
+whether that neighbor is visible may have changed. The "shadowcast" algorithm always rebuilds the whole vision range.
+
+"""
+def update_vision_range(camera, tile, environment):
+    if constants.VISION_ALGORITHM != "bresenham" or tuple(tile) == tuple(camera.pos):
+        return get_vision_range(camera.pos, environment)
+    known = np.array(camera.vision_range)
+    ys, xs = np.indices(known.shape)
+    known[may_line_pass_through_tile(camera.pos, tile, xs, ys)] = 0
+    return get_bresenham_vision_range(camera.pos, environment, known)
+
+"""
+    
+Inputs:
+- map_memory_name -> name of the shared memory block holding the environment's map
+- size -> the (height, width) of the environment's map
+
 Output:
 - N/A
 
 Description:
-This function updates the vision ranges of every camera within environment. It uses is_pos_visible_from_pos along with a
-Breadth-First Search approach to only test tiles that could feasibly be visible from the camera's position.
+This function is the initializer of every process used by initialize_vision_ranges_in_parallel. It attaches to
+the shared memory block once per process so that the map is never pickled and sent with individual tasks.
 
 """
+def _init_vision_worker(map_memory_name, size):
+    global _worker_memory, _worker_environment
+    _worker_memory = shared_memory.SharedMemory(name=map_memory_name)
+    environment_map = np.ndarray(size, dtype=np.float64, buffer=_worker_memory.buf)
+    environment_map.flags.writeable = False
+    _worker_environment = SimpleNamespace(map=environment_map, size=tuple(size))
 
-def initialize_vision_ranges(environment):
+"""
+    
+Inputs:
+- positions -> the (x,y) positions of a group of consecutive cameras
+- algorithm -> the vision algorithm to use (see get_vision_range)
 
-    def is_pos_on_map(pos, environment):
-        x,y = pos
-        return x >= 0 and x < environment.width and y >= 0 and y < environment.height
-
-    for camera in environment.cameras:
-        camera.vision_range = np.zeros(environment.size)
-        start_position = camera.pos
-        position_queue = Queue()
-        position_queue.put(start_position)
-        """
-          Start at the camera's position, then recursively build outward as follows (BFS):
-          1. If the current position's value is 0 and is not a wall, check if we can draw a line from the current position to the camera's 
-          position without hitting a wall. If we can, set the vision range value of that position to 1 and add neighboring positions to
-          the position queue. Otherwise, set it to 2.
-        """
-        while not position_queue.empty():
-            current_position = curr_x, curr_y = position_queue.get()
-            # Error on next line with (8,0)
-            if is_pos_on_map(current_position, environment) and camera.vision_range[curr_y, curr_x] == 0 and environment.map[curr_y, curr_x] == 0:
-                if is_pos_visible_from_pos(start_position, current_position, environment):                    
-                    camera.vision_range[curr_y, curr_x] = 1
-                    position_queue.put((curr_x - 1, curr_y - 1))
-                    position_queue.put((curr_x, curr_y - 1))
-                    position_queue.put((curr_x + 1, curr_y - 1))
-                    position_queue.put((curr_x - 1, curr_y))
-                    position_queue.put((curr_x + 1, curr_y))
-                    position_queue.put((curr_x - 1, curr_y + 1))
-                    position_queue.put((curr_x, curr_y + 1))
-                    position_queue.put((curr_x + 1, curr_y + 1))
-                else:
-                    camera.vision_range[curr_y, curr_x] = 2
+Output:
+- The packed vision ranges of the cameras (see packed_vision.py)
+
+Description:
+This function computes the vision ranges of a group of cameras inside a worker process. Only the packed vision
+ranges are sent back, which take a quarter of a byte per tile and camera.
+
+"""
+def _compute_vision_ranges_in_worker(positions, algorithm):
+    vision_ranges = PackedVisionRanges(len(positions), _worker_environment.size)
+    for i, position in enumerate(positions):
+        vision_ranges.set(i, get_vision_range(position, _worker_environment, algorithm))
+    return vision_ranges
+
+"""
+    
+Inputs:
+- environment -> the environment containing the cameras
+- workers -> the number of processes to use
+
+Output:
+- The packed vision ranges of every camera (see packed_vision.py)
+
+Description:
+This function computes the vision ranges of every camera within environment using a pool of processes. The map
+is placed in shared memory and mapped read-only by every process, so it is never pickled. Each task computes a
+group of cameras whose size is a multiple of 8, so the packed vision ranges it returns fill whole bytes and are
+copied straight into the final arrays as soon as the task finishes. No other array of every camera's vision
+range is ever created.
+
+"""
+def initialize_vision_ranges_in_parallel(environment, workers):
+    num_cameras = len(environment.cameras)
+    size = tuple(int(n) for n in environment.map.shape)
+    environment_map = np.ascontiguousarray(environment.map, dtype=np.float64)
+    map_memory = shared_memory.SharedMemory(create=True, size=max(1, environment_map.nbytes))
+    try:
+        np.ndarray(size, dtype=np.float64, buffer=map_memory.buf)[:] = environment_map
+        vision_ranges = PackedVisionRanges(num_cameras, size)
+
+        # A few tasks per worker keeps every process busy even when some cameras see much more than others
+        chunk_size = max(1, -(-num_cameras // (workers * 4 * 8))) * 8
+        positions = [(int(camera.x), int(camera.y)) for camera in environment.cameras]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_vision_worker,
+                                 initargs=(map_memory.name, size)) as executor:
+            tasks = dict()
+            for start in range(0, num_cameras, chunk_size):
+                task = executor.submit(_compute_vision_ranges_in_worker, positions[start:start + chunk_size], constants.VISION_ALGORITHM)
+                tasks[task] = start
+            for task in as_completed(tasks):
+                vision_ranges.set_group(tasks.pop(task), task.result())
+    finally:
+        map_memory.close()
+        map_memory.unlink()
+    return vision_ranges
+
+"""
+    
+Inputs:
+- environment -> the environment containing the start and end positions
+
+Output:
+- N/A
+
+Description:
+This function builds the vision ranges of every camera within environment using the algorithm selected by
+VISION_ALGORITHM (see get_vision_range) and hands them to environment.set_vision_ranges(). If VISION_WORKERS allows more than one process, the cameras are split across a process pool
+with initialize_vision_ranges_in_parallel, giving each process at least VISION_PARALLEL_MIN_CAMERAS cameras. Maps
+with fewer cameras are computed serially: starting the pool takes about 20 ms while a vision range of the shipped
+100x100 maps takes 5 to 35 ms, so a handful of cameras (such as the 12 of many_cameras.txt) is never faster in
+parallel.
+
+If VISION_CACHE is True, the vision ranges are loaded from the map's vision cache when it is up to date and
+are saved to it otherwise (see vision_cache.py).
+
+If VISION_LAZY is True, no vision range is built here. The environment is given a vision store instead, which
+builds each vision range (or reads it from an up to date vision cache) the first time it is used.
+
+"""
+
+def initialize_vision_ranges(environment):
+    if constants.VISION_LAZY:
+        source = vision_cache.load_vision_ranges(environment) if constants.VISION_CACHE else None
+        environment.set_vision_store(vision_store.VisionStore(environment, constants.VISION_MEMORY_LIMIT, source))
+        return
+    if constants.VISION_CACHE:
+        vision_ranges = vision_cache.load_vision_ranges(environment)
+        if vision_ranges is not None:
+            environment.set_vision_ranges(vision_ranges)
+            return
+    workers = constants.VISION_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(environment.cameras) // constants.VISION_PARALLEL_MIN_CAMERAS)
+    if workers > 1:
+        vision_ranges = initialize_vision_ranges_in_parallel(environment, workers)
+    else:
+        vision_ranges = PackedVisionRanges(len(environment.cameras), environment.map.shape)
+        for i, camera in enumerate(environment.cameras):
+            vision_ranges.set(i, get_vision_range(camera.pos, environment))
+    environment.set_vision_ranges(vision_ranges)
+    if constants.VISION_CACHE:
+        vision_cache.save_vision_ranges(environment)
                 
 """
     
@@ -141,21 +542,71 @@ Output:
 - 2D array describing the object's visual appearance from the camera's point of view
 
 Description:
-This function takes the object's true visual appearance and removes (override to 0) all pixels that aren't visible to the camera
+This function takes the object's true visual appearance (rotated to the object's current orientation) and removes
+(override to 0) all pixels that aren't visible to the camera. A pixel is visible when its tile is part of the camera's
+vision range, so the whole appearance is computed by slicing the vision range over the object's footprint. Pixels
+that lie outside of the map are never visible.
+
+Appearances are cached in environment.appearance_cache for the rest of the frame, so the output is read-only and
+shared between callers. A cached appearance is only reused while the object has not moved since it was computed.
 
 """
 def get_object_appearance(camera, object, environment):
-    cx, cy = int(object.pos[0]), int(object.pos[1])
-    appearance = copy.deepcopy(object.visual)
-    for x in range(cx, cx + object.width):
-        for y in range(cy, cy + object.height):
-            end = x,y
-            if not is_pos_visible_from_pos(camera.pos, end, environment):
-                appearance[cx - x, cy - y] = 0
+    key = camera.id, object.id
+    cached = environment.appearance_cache.get(key)
+    if cached is not None and cached[0] == object.version:
+        return cached[1]
+
+    visual = object.rotate(object.orientation)
+    x0, y0, x1, y1 = get_object_footprint(object)
+    height, width = environment.map.shape
+    clipped_x0, clipped_y0 = max(x0, 0), max(y0, 0)
+    clipped_x1, clipped_y1 = min(x1, width), min(y1, height)
+    visible = np.zeros(visual.shape, dtype=bool)
+    if clipped_x0 < clipped_x1 and clipped_y0 < clipped_y1:
+        # Visuals are indexed [x, y] while vision ranges are indexed [y, x]
+        visible[clipped_x0 - x0:clipped_x1 - x0, clipped_y0 - y0:clipped_y1 - y0] = \
+            camera.get_visible_region(clipped_x0, clipped_y0, clipped_x1, clipped_y1).T
+    appearance = np.where(visible, visual, 0)
+    appearance.flags.writeable = False
+    environment.appearance_cache[key] = object.version, appearance
     return appearance
 
 """
     
+Inputs:
+- object -> an object
+
+Output:
+- A 4-tuple of (x0, y0, x1, y1) describing the rectangle of tiles covered by the object in its current orientation,
+where (x0, y0) is inclusive and (x1, y1) is exclusive
+
+"""
+def get_object_footprint(object):
+    x0, y0 = int(object.pos[0]), int(object.pos[1])
+    object_width, object_height = object.rotate(object.orientation).shape
+    return x0, y0, x0 + object_width, y0 + object_height
+
+"""
+    
+Inputs:
+- object -> an object
+- environment -> the environment containing the object
+
+Output:
+- A list of every camera whose vision range covers at least one tile of the object's footprint
+
+Description:
+This function looks the object's footprint up in the environment's camera_visibility index, so its cost
+depends on the number of cameras covering the object rather than on the total number of cameras.
+
+"""
+def get_cameras_seeing_object(object, environment):
+    camera_ids = environment.get_cameras_seeing_region(*get_object_footprint(object))
+    return [environment.cameras[i] for i in camera_ids]
+
+"""
+    
 Inputs:
 - camera -> a camera
 - object -> an object
@@ -194,13 +645,13 @@ def send_handshake(sender, receiver, object, environment):
 """
     
 Inputs:
-- cameras -> a list of all cameras in the environment
+- cameras -> a list of cameras, usually every camera in the environment or the cameras that received a handshake
 
 Output:
 - N/A
 
 Description:
-This function sets all cameras to have an empty handshake. This is called to make sure
+This function sets all given cameras to have an empty handshake. This is called to make sure
 that cameras don't use outdated handshakes.
 
 """
@@ -210,6 +661,34 @@ def reset_handshakes(cameras):
 
 """
     
+Inputs:
+- camera -> a camera
+- target_pos -> the position derived from a handshake
+- environment -> the environment containing the camera
+
+Output:
+- A list of the objects, sorted by id, that may be the object described by the handshake
+
+Description:
+This function uses the environment's object grid to find the objects within MATCH_GATING_RADIUS of target_pos,
+then only keeps the ones that are at least partially inside the camera's vision range. Its cost depends on the
+number of objects near target_pos rather than on the total number of objects.
+
+"""
+def get_candidate_objects(camera, target_pos, environment):
+    if constants.MATCH_GATING_RADIUS is None:
+        nearby = environment.objects
+    else:
+        nearby = environment.object_grid.query(target_pos, constants.MATCH_GATING_RADIUS)
+    candidates = list()
+    for object in nearby:
+        x0, y0, x1, y1 = get_object_footprint(object)
+        if np.any(camera.get_visible_region(max(x0, 0), max(y0, 0), max(x1, 0), max(y1, 0))):
+            candidates.append(object)
+    return candidates
+
+"""
+    
 Inputs:
 - camera -> a camera
 - objects -> a list of all objects in the environment
@@ -220,13 +699,16 @@ Output:
 or the camera has an empty handshake.
 
 Description:
-This function takes the camera's handshake and uses get_best_object_match() to get the object that best matches it.
+This function takes the camera's handshake and uses get_best_object_match() to get the object among objects that
+best matches it. Only the objects returned by get_candidate_objects() are considered.
 
 """
 def find_object_with_handshake(camera, objects, environment):
     if camera.handshake is not None:
         previous_pos, previous_appearance = camera.handshake
-        best_object = get_best_object_match(camera, objects, previous_pos, previous_appearance, environment)
+        object_ids = set(object.id for object in objects)
+        candidates = [object for object in get_candidate_objects(camera, previous_pos, environment) if object.id in object_ids]
+        best_object = get_best_object_match(camera, candidates, previous_pos, previous_appearance, environment)
         return best_object
     return None
 
@@ -267,15 +749,7 @@ def get_size_difference(camera, object1, target_appearance, environment):
     extra_rows = np.sum(~appearance2.any(1))
     
     # Remove outside zero columns
-    extra_columns = 0
-    for i in range(appearance1.shape[1]):
-        is_all_zeros = True
-        for j in range(appearance1.shape[0]):
-            if appearance1[j,i] != 0:
-                is_all_zeros = False
-                break
-        if is_all_zeros:
-            extra_columns += 1
+    extra_columns = np.sum(~appearance1.any(0))
 
     height = appearance1.shape[0] - extra_rows
     width = appearance1.shape[1] - extra_columns
@@ -299,46 +773,109 @@ def get_appearance_difference(camera, object1, target_appearance, environment):
     combined_height = max(appearance1.shape[0], appearance2.shape[0])
     combined_width = max(appearance1.shape[1], appearance2.shape[1])
 
-    def get_pixel(x, y, appearance):
-        if y >= appearance.shape[0] or x >= appearance.shape[1]:
-            return 0
-        return appearance[y][x]
-
-    sum = 0.0
-    for y in range(combined_height):
-        for x in range(combined_width):
-            val1 = get_pixel(x,y, appearance1)
-            val2 = get_pixel(x,y, appearance2)
-            sum += abs(val2 - val1)
+    # Pixels outside of an appearance count as 0
+    padded1 = np.zeros((combined_height, combined_width))
+    padded1[:appearance1.shape[0], :appearance1.shape[1]] = appearance1
+    padded2 = np.zeros((combined_height, combined_width))
+    padded2[:appearance2.shape[0], :appearance2.shape[1]] = appearance2
+    sum = np.abs(padded2 - padded1).sum()
     normalized_sum = sum / (combined_height * combined_width)
 
     return normalized_sum
 
 """
     
+Inputs:
+- weights -> a 3-tuple of the position, appearance, and size weights, or None
+
+Output:
+- weights, or (POS_CONST, APPEARANCE_CONST, SIZE_CONST) if weights is None
+
+"""
+def get_match_weights(weights):
+    if weights is None:
+        return constants.POS_CONST, constants.APPEARANCE_CONST, constants.SIZE_CONST
+    return weights
+
+"""
+    
 Inputs:
 - camera -> a camera
 - object -> the object to compare against the handshake
 - target_pos -> the position derived from the handshake
 - target_appearance -> the appearance derived from the handshake
 - environment -> the environment containing the camera and objects
-- verbose -> if True, print out difference values
+- verbose -> if True, print out difference values. If None, VERBOSE_MATCHING is used.
+- weights -> a 3-tuple of the position, appearance, and size weights. If None, (POS_CONST, APPEARANCE_CONST, SIZE_CONST)
+is used.
 
 Output:
 - A value corresponding to the difference between the given object and handshake.
 
 Description:
 The value returned by this algorithm is the weighted average of the position difference, appearance difference,
-and size difference as determined by POS_CONST, APPEARANCE_CONST, and SIZE_CONST.
+and size difference as determined by POS_CONST, APPEARANCE_CONST, and SIZE_CONST (or weights).
 
 """
-def get_object_match(camera, object, target_pos, target_appearance, environment, verbose = True):
+def get_object_match(camera, object, target_pos, target_appearance, environment, verbose = None, weights = None):
     pos_diff = abs(target_pos[0] - object.pos[0]) + abs(target_pos[1] - object.pos[1])
     appearance_diff = get_appearance_difference(camera, object, target_appearance, environment)
     size_diff = get_size_difference(camera, object, target_appearance, environment)
-    if verbose:
+    if constants.VERBOSE_MATCHING if verbose is None else verbose:
         print("Pos Diff =", pos_diff, "Appearance Diff =", appearance_diff, "Size Diff =", size_diff)
-    return pos_diff*constants.POS_CONST + appearance_diff*constants.APPEARANCE_CONST + size_diff*constants.SIZE_CONST
+    pos_const, appearance_const, size_const = get_match_weights(weights)
+    return pos_diff*pos_const + appearance_diff*appearance_const + size_diff*size_const
+
+"""
+    
+Inputs:
+- camera -> a camera
+- objects -> the objects to compare against the handshake
+- target_pos -> the position derived from the handshake
+- target_appearance -> the appearance derived from the handshake
+- environment -> the environment containing the camera and objects
+- weights -> a 3-tuple of the position, appearance, and size weights (see get_object_match)
+
+Output:
+- A 4-tuple of arrays (scores, pos_diffs, appearance_diffs, size_diffs), each with one entry per object, where
+scores[i] equals get_object_match() for objects[i]
+
+Description:
+This function scores every object against the handshake at once. The appearances of all objects are padded with
+zeros into one array of shape (number of objects, height, width), which is large enough to also hold the target
+appearance, so that the position, appearance, and size differences of every object are computed with a handful of
+NumPy operations instead of one Python loop per object.
+
+"""
+def get_object_match_scores(camera, objects, target_pos, target_appearance, environment, weights = None):
+    num_objects = len(objects)
+    appearances = [get_object_appearance(camera, object, environment) for object in objects]
+    shapes = np.array([appearance.shape for appearance in appearances], dtype=np.int64).reshape(num_objects, 2)
+    target_height, target_width = target_appearance.shape
+    padded_height = max([target_height] + [appearance.shape[0] for appearance in appearances])
+    padded_width = max([target_width] + [appearance.shape[1] for appearance in appearances])
+    padded = np.zeros((num_objects, padded_height, padded_width))
+    for i, appearance in enumerate(appearances):
+        padded[i, :appearance.shape[0], :appearance.shape[1]] = appearance
+    padded_target = np.zeros((padded_height, padded_width))
+    padded_target[:target_height, :target_width] = target_appearance
+
+    positions = np.array([object.pos for object in objects], dtype=np.float64).reshape(num_objects, 2)
+    pos_diffs = np.abs(target_pos[0] - positions[:, 0]) + np.abs(target_pos[1] - positions[:, 1])
+
+    # Same as get_appearance_difference: the summed pixel difference over the combined size of both appearances
+    combined_area = np.maximum(shapes[:, 0], target_height) * np.maximum(shapes[:, 1], target_width)
+    appearance_diffs = np.abs(padded_target - padded).sum(axis=(1, 2)) / combined_area
+
+    # Same as get_size_difference: empty rows are counted in the target, empty columns in each object's appearance
+    extra_rows = np.sum(~target_appearance.any(1))
+    in_appearance = np.arange(padded_width)[None, :] < shapes[:, 1, None]
+    extra_columns = np.sum(~padded.any(axis=1) & in_appearance, axis=1)
+    size_diffs = np.abs(shapes[:, 0] - extra_rows - target_height) + np.abs(shapes[:, 1] - extra_columns - target_width)
+
+    pos_const, appearance_const, size_const = get_match_weights(weights)
+    scores = pos_diffs*pos_const + appearance_diffs*appearance_const + size_diffs*size_const
+    return scores, pos_diffs, appearance_diffs, size_diffs
 
 """
     
@@ -348,26 +885,30 @@ Inputs:
 - target_pos -> the position derived from the handshake
 - target_appearance -> the appearance derived from the handshake
 - environment -> the environment containing the camera and objects
-- verbose -> if True, print out difference values
+- verbose -> if True, print out difference values. If None, VERBOSE_MATCHING is used.
+- return_scores -> if True, also return the score of every object
+- weights -> a 3-tuple of the position, appearance, and size weights (see get_object_match)
 
 Output:
-- The object that has the least difference with the handshake object
+- The object that has the least difference with the handshake object. If return_scores is True, a 2-tuple of that
+object and the array of scores from get_object_match_scores() is returned instead.
 
 """
-def get_best_object_match(camera, objects, target_pos, target_appearance, environment, verbose = True):
+def get_best_object_match(camera, objects, target_pos, target_appearance, environment, verbose = None, return_scores = False, weights = None):
     best_object = None
     best_match = 100000
-    if verbose:
+    scores, pos_diffs, appearance_diffs, size_diffs = get_object_match_scores(camera, objects, target_pos, target_appearance, environment, weights)
+    if len(objects) > 0 and scores.min() < best_match:
+        best_object = objects[int(np.argmin(scores))]
+    if constants.VERBOSE_MATCHING if verbose is None else verbose:
         print("-------------------")
-    for object in objects:
-        match = get_object_match(camera, object, target_pos, target_appearance, environment, verbose)
-        if verbose:
-           print("Total match for id ", object.id, "=", match)
-        if match < best_match:
-            best_object = object
-            best_match = match
-            if verbose:
-                print("New Best match =", best_object.id)
-    if verbose:
+        for i, object in enumerate(objects):
+            print("Pos Diff =", pos_diffs[i], "Appearance Diff =", appearance_diffs[i], "Size Diff =", size_diffs[i])
+            print("Total match for id ", object.id, "=", scores[i])
+            if scores[i] < best_match:
+                best_match = scores[i]
+                print("New Best match =", object.id)
         print("-------------------")
-    return best_object
\ No newline at end of file
+    if return_scores:
+        return best_object, scores
+    return best_object
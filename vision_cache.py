@@ -0,0 +1,113 @@
+"""
+
+This file contains a persistent on-disk cache of camera vision ranges. Vision ranges only
+depend on the walls of a map and the positions of its cameras, so they are stored next to the
+map file (as maps/<map name>.<key>.vision.npy) and reused on later runs instead of being
+recomputed. The key is a hash of everything the vision ranges depend on, so editing a map
+automatically invalidates its cache.
+
+The cache is stored as a single uint8 array of shape (2, ceil(number of cameras / 8), height, width)
+holding the visible and blocked bits of the packed vision ranges (see packed_vision.py), which is
+memory-mapped when loaded so that opening it costs almost nothing.
+
+"""
+
+import constants
+import glob
+import hashlib
+import numpy as np
+import os
+from packed_vision import PackedVisionRanges
+
+# Increase this whenever the contents of vision ranges change so that old caches are ignored
+CACHE_VERSION = 2
+
+
+"""
+    
+Inputs:
+- environment -> an environment
+
+Output:
+- A hex string uniquely describing the walls, camera positions, and vision algorithm of environment
+
+"""
+def get_cache_key(environment):
+    key = hashlib.sha256()
+    key.update(str(CACHE_VERSION).encode())
+    key.update(constants.VISION_ALGORITHM.encode())
+    key.update(np.asarray(environment.map.shape, dtype=np.int64).tobytes())
+    key.update(np.packbits(environment.map > 0).tobytes())
+    key.update(np.packbits(environment.map < 0).tobytes())
+    positions = np.array([(camera.x, camera.y) for camera in environment.cameras], dtype=np.int64)
+    key.update(positions.tobytes())
+    return key.hexdigest()[:16]
+
+"""
+    
+Inputs:
+- environment -> an environment
+- key -> the cache key of environment. If None, any key matches (used to find stale caches).
+
+Output:
+- The path of the vision cache of environment, or None if environment was not loaded from a map file
+
+"""
+def get_cache_path(environment, key = None):
+    if environment.file_name is None:
+        return None
+    return "maps/" + environment.file_name + "." + (key or "*") + ".vision.npy"
+
+"""
+    
+Inputs:
+- environment -> an environment whose cameras have no vision ranges yet
+
+Output:
+- The read-only memory-mapped packed vision ranges of environment (see packed_vision.py), or None if there is
+no up to date cache
+
+"""
+def load_vision_ranges(environment):
+    path = get_cache_path(environment, get_cache_key(environment))
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        packed = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    num_cameras = len(environment.cameras)
+    if packed.dtype != np.uint8 or packed.shape != (2, (num_cameras + 7) // 8) + environment.map.shape:
+        return None
+    return PackedVisionRanges(num_cameras, environment.map.shape, packed[0], packed[1])
+
+"""
+    
+Inputs:
+- environment -> an environment whose vision ranges have been initialized
+
+Output:
+- N/A
+
+Description:
+This function stores environment.vision_ranges in the cache and removes any stale caches
+of the same map. The file is written under a temporary name first so that an interrupted run never leaves a
+truncated cache behind.
+
+"""
+def save_vision_ranges(environment):
+    path = get_cache_path(environment, get_cache_key(environment))
+    if path is None:
+        return
+    temporary_path = path + ".tmp.npy"
+    vision_ranges = environment.vision_ranges
+    # Both arrays are written straight into the file instead of being stacked into a new array first
+    packed = np.lib.format.open_memmap(temporary_path, mode="w+", dtype=np.uint8, shape=(2,) + vision_ranges.visible.shape)
+    packed[0] = vision_ranges.visible
+    packed[1] = vision_ranges.blocked
+    packed.flush()
+    del packed
+    os.replace(temporary_path, path)
+    for stale_path in glob.glob(get_cache_path(environment)):
+        if stale_path != path:
+            os.remove(stale_path)
@@ -0,0 +1,293 @@
+"""
+
+A vision store builds camera vision ranges on demand instead of building every camera's vision range
+before the simulation starts (see VISION_LAZY in constants.py). A vision range is built the first time
+it is used and kept in a cache whose total size never exceeds a memory limit. When the cache is full,
+the vision ranges of the cameras farthest from every focus position (the positions of the tracked
+objects) are evicted first, and the least recently used ones among equally distant cameras.
+
+The vision ranges of the cameras nearest to the tracking camera can be prefetched, in which case they
+are built by a background thread while the simulation continues.
+
+If the map has an up to date vision cache (see vision_cache.py), vision ranges are read from it
+instead of being built.
+
+"""
+
+import numpy as np
+import threading
+import utils
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class VisionStore:
+
+    """
+
+    Inputs:
+    - environment -> the environment whose cameras' vision ranges are stored
+    - memory_limit -> the largest number of bytes of vision ranges kept at once. At least one vision range is
+    always kept.
+    - source -> if not None, the (possibly memory-mapped) packed vision ranges of every camera (see packed_vision.py)
+    to read vision ranges from instead of building them
+
+    """
+    def __init__(self, environment, memory_limit, source = None):
+        self.environment = environment
+        self.memory_limit = memory_limit
+        self.source = source
+        self.camera_positions = np.array([camera.pos for camera in environment.cameras], dtype=np.float64).reshape(-1, 2)
+        # Maps camera ids to vision ranges, from least to most recently used
+        self.vision_ranges = OrderedDict()
+        self.memory_used = 0
+        self.focus_positions = np.zeros((0, 2))
+        self.lock = threading.Lock()
+        # Maps the camera ids whose vision ranges are being prefetched to their futures
+        self.pending = dict()
+        self.executor = None
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - The camera's read-only vision range, which is built (or waited for, if it is being prefetched) if it is
+    not in the cache
+
+    """
+    def get(self, camera_id):
+        with self.lock:
+            vision_range = self.vision_ranges.get(camera_id)
+            if vision_range is not None:
+                self.vision_ranges.move_to_end(camera_id)
+                return vision_range
+            future = self.pending.get(camera_id)
+        if future is not None:
+            return future.result()
+        return self.insert(camera_id, self.build(camera_id))
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - x0, y0 -> the top left corner of a rectangle of tiles (inclusive)
+    - x1, y1 -> the bottom right corner of the rectangle (exclusive)
+
+    Output:
+    - Boolean array of the tiles of the rectangle, clipped to the map, that the camera can see (see get())
+
+    """
+    def get_visible(self, camera_id, x0, y0, x1, y1):
+        return self.get(camera_id)[y0:y1, x0:x1] == 1
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - The camera's read-only vision range, read from the source or built with get_vision_range() in utils.py
+
+    """
+    def build(self, camera_id):
+        if self.source is not None:
+            vision_range = self.source.get(camera_id)
+        else:
+            vision_range = utils.get_vision_range(self.environment.cameras[camera_id].pos, self.environment)
+        vision_range.flags.writeable = False
+        return vision_range
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+    - vision_range -> the camera's vision range
+
+    Output:
+    - The cached vision range of the camera
+
+    Description:
+    This function adds the vision range to the cache as the most recently used one and evicts other vision ranges
+    until the cache fits within the memory limit again. If the camera is already cached, the cached vision range
+    is kept.
+
+    """
+    def insert(self, camera_id, vision_range):
+        with self.lock:
+            if camera_id in self.vision_ranges:
+                self.vision_ranges.move_to_end(camera_id)
+                return self.vision_ranges[camera_id]
+            self.vision_ranges[camera_id] = vision_range
+            self.memory_used += vision_range.nbytes
+            while self.memory_used > self.memory_limit and len(self.vision_ranges) > 1:
+                evicted = self.vision_ranges.pop(self.get_eviction_candidate())
+                self.memory_used -= evicted.nbytes
+            return vision_range
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - The id of the cached camera that should be evicted next. The most recently used camera is never evicted.
+
+    """
+    def get_eviction_candidate(self):
+        camera_ids = list(self.vision_ranges)[:-1]
+        if len(self.focus_positions) == 0:
+            return camera_ids[0]
+        positions = self.camera_positions[camera_ids]
+        distances = np.abs(positions[:, None, :] - self.focus_positions[None, :, :]).sum(axis=2).min(axis=1)
+        # np.argmax returns the first of equally distant cameras, which is the least recently used one
+        return camera_ids[int(np.argmax(distances))]
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - A list of (camera id, vision range) pairs of every cached vision range
+
+    """
+    def get_cached(self):
+        with self.lock:
+            return list(self.vision_ranges.items())
+
+    """
+
+    Inputs:
+    - camera_ids -> the ids of cameras whose vision ranges are out of date
+
+    Output:
+    - N/A
+
+    Description:
+    This function is called when the map changes. It removes the given cameras' vision ranges from the cache and
+    stops reading from the source, which no longer matches the map.
+
+    """
+    def discard(self, camera_ids):
+        with self.lock:
+            self.source = None
+            for camera_id in camera_ids:
+                vision_range = self.vision_ranges.pop(camera_id, None)
+                if vision_range is not None:
+                    self.memory_used -= vision_range.nbytes
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - N/A
+
+    Description:
+    This function waits until every vision range being prefetched has been added to the cache.
+
+    """
+    def wait_for_prefetches(self):
+        with self.lock:
+            pending = list(self.pending.values())
+        for future in pending:
+            future.result()
+
+    """
+
+    Inputs:
+    - positions -> a list of (x,y) positions, usually of the tracked objects
+
+    Output:
+    - N/A
+
+    """
+    def set_focus(self, positions):
+        with self.lock:
+            self.focus_positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera, usually the tracking camera
+    - count -> the number of cameras nearest to the camera to prefetch
+
+    Output:
+    - N/A
+
+    Description:
+    This function builds the vision ranges of the count cameras nearest to the given camera in a background
+    thread, skipping the ones that are already cached or being prefetched.
+
+    """
+    def prefetch(self, camera_id, count):
+        if count <= 0:
+            return
+        distances = np.abs(self.camera_positions - self.camera_positions[camera_id]).sum(axis=1)
+        nearest = np.argsort(distances, kind="stable")[:count + 1]
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers = 1)
+            for neighbor_id in nearest.tolist():
+                if neighbor_id == camera_id or neighbor_id in self.vision_ranges or neighbor_id in self.pending:
+                    continue
+                self.pending[neighbor_id] = self.executor.submit(self.prefetch_camera, neighbor_id)
+
+    """
+
+    Inputs:
+    - camera_id -> the id of a camera
+
+    Output:
+    - The camera's vision range
+
+    Description:
+    This function runs in the background thread. It builds the vision range of a prefetched camera and adds it
+    to the cache.
+
+    """
+    def prefetch_camera(self, camera_id):
+        try:
+            return self.insert(camera_id, self.build(camera_id))
+        finally:
+            with self.lock:
+                self.pending.pop(camera_id, None)
+
+    """
+
+    Inputs:
+    - x0, y0 -> the top left corner of a rectangle of tiles (inclusive)
+    - x1, y1 -> the bottom right corner of the rectangle (exclusive)
+    - radius -> the largest distance between the rectangle and a returned camera. If None, every camera is returned.
+
+    Output:
+    - Array of the ids of every camera within radius tiles of the rectangle (measured like the position difference
+    of get_object_match() in utils.py), in increasing order
+
+    """
+    def get_nearby_cameras(self, x0, y0, x1, y1, radius):
+        if radius is None:
+            return np.arange(len(self.camera_positions))
+        xs, ys = self.camera_positions[:, 0], self.camera_positions[:, 1]
+        dx = np.maximum(np.maximum(x0 - xs, xs - (x1 - 1)), 0)
+        dy = np.maximum(np.maximum(y0 - ys, ys - (y1 - 1)), 0)
+        return np.flatnonzero(dx + dy <= radius)
+
+    """
+
+    Inputs:
+    - N/A
+
+    Output:
+    - N/A
+
+    Description:
+    This function waits for every prefetch to finish and stops the background thread.
+
+    """
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait = True)
+            self.executor = None